@@ -0,0 +1,18 @@
+// C# sample, source.map( in a comment
+using System;
+using System.Reactive.Linq;
+
+/* block .filter( comment */
+public class Sample
+{
+    private const string Path = @"C:\dir\.map(""x"")";
+    private const string Text = "text .filter(";
+
+    public void Run(IObservable<int> source)
+    {
+        source.Select(x => x + 1)
+              .Where(x => x > 0)
+              .Subscribe(Console.WriteLine);
+        Console.WriteLine($"value .take({Text})");
+    }
+}
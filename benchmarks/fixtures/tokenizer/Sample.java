@@ -0,0 +1,27 @@
+/*
+ * Copyright notice. Use source.map(...) and .filter( freely.
+ */
+package com.example;
+
+import io.reactivex.Observable;
+
+/**
+ * Javadoc: call {@code observable.flatMap(f)} then .subscribe().
+ */
+public class Sample {
+    // observable.map(x -> x) is commented out
+    private static final String TEXT = "not a call: .map(1) .filter(";
+    private static final char QUOTE = '"';
+    private static final String BLOCK = """
+        text block .take(3) with "quotes"
+        """;
+
+    public void run(Observable<Integer> source) {
+        source.map(x -> x + 1)
+              .filter(x -> x > 0)
+              .take(10)
+              .subscribe(System.out::println);
+        String path = "C:\\dir\\.map(";
+        source.flatMap(x -> Observable.just(x)).subscribe();
+    }
+}
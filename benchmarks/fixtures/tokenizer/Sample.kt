@@ -0,0 +1,20 @@
+// Kotlin sample, .map( in a line comment
+package com.example
+
+import io.reactivex.rxkotlin.subscribeBy
+
+/* block comment with .filter(
+   over lines */
+class Sample {
+    val raw = """
+        raw string .take(1) "quoted"
+    """
+    val c = '\''
+
+    fun run(source: Observable<Int>) {
+        source.map { it + 1 }
+            .filter { it > 0 }
+            .subscribeBy(onNext = { println("next .map( $it") })
+        source.take(5).toList().subscribe()
+    }
+}
@@ -0,0 +1,20 @@
+// RxSwift sample: observable.map( in a comment
+import RxSwift
+
+/* block comment .filter(
+   spanning lines */
+final class Sample {
+    let disposeBag = DisposeBag()
+    let text = "literal .map( and .filter("
+    let multi = """
+        multi line .take(1) "quoted"
+        """
+
+    func run(source: Observable<Int>) {
+        source.map { $0 + 1 }
+            .filter { $0 > 0 }
+            .take(3)
+            .subscribe(onNext: { print("next .map( \($0)") })
+            .disposed(by: disposeBag)
+    }
+}
@@ -0,0 +1,19 @@
+// RxDart sample, stream.map( in a comment
+import 'package:rxdart/rxdart.dart';
+
+/// Doc comment: subject.debounceTime(...).listen(...)
+class Sample {
+  final text = 'single .map( and .where(';
+  final other = "double .debounceTime(";
+  final multi = '''
+    multi line .take(1)
+  ''';
+
+  void run(Stream<int> source) {
+    source
+        .map((x) => x + 1)
+        .where((x) => x > 0)
+        .debounceTime(const Duration(milliseconds: 10))
+        .listen((x) => print('next .map( $x'));
+  }
+}
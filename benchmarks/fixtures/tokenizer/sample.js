@@ -0,0 +1,16 @@
+/* bundled helper: observable.map( and .filter( documented here */
+'use strict';
+var Rx = require('rxjs');
+
+// source.take(1).subscribe() example
+function run(source) {
+  var label = "calls like .map( in a string";
+  var single = 'and .filter( here';
+  var tpl = `template .take(2) text`;
+  return source
+    .map(function (x) { return x * 2; })
+    .filter(function (x) { return x > 2; })
+    .subscribe(function (x) { console.log(x); });
+}
+
+module.exports = { run: run };
@@ -0,0 +1,24 @@
+// Angular service: this.http.get(url).map(...) in a comment
+import { Injectable } from '@angular/core';
+import { map, filter } from 'rxjs/operators';
+
+/**
+ * Loads items. Example: items$.pipe(map(x => x)).subscribe()
+ */
+@Injectable()
+export class SampleService {
+  private readonly label = 'pipe .map( and .filter(';
+  private readonly url = "/api/items?x=.take(";
+
+  load(): Observable<Item[]> {
+    const message = `loading .take(1) items`;
+    return this.http.get<Item[]>(this.url).pipe(
+      map(items => items.filter(item => item.visible)),
+      filter(items => items.length > 0)
+    );
+  }
+
+  watch() {
+    this.load().subscribe(items => console.log(`got ${items.length}`));
+  }
+}
@@ -0,0 +1,51 @@
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from repositories_processing import OPERANDS_PATH, count_usage_rxjs  # noqa: E402
+from usage_scanner import PipeOperandMatcher  # noqa: E402
+
+# a minified bundle is mostly long lines of pipes like this one
+BUNDLE_CHUNK = ('e.pipe(map(function(t){return t.id}),filter(Boolean),switchMap(function(t){return n.get("/a(b)")'
+                '.pipe(take(1),catchError(function(){return of(null)}))}),distinctUntilChanged());var r=function(t)'
+                '{return t*2};')
+# the old function is quadratic, so it only gets the smaller bundles
+OLD_SIZES = [64 * 1024, 256 * 1024, 1024 * 1024]
+NEW_SIZES = OLD_SIZES + [4 * 1024 * 1024, 16 * 1024 * 1024]
+
+
+def bundle(size):
+    return (BUNDLE_CHUNK * (size // len(BUNDLE_CHUNK) + 1))[:size]
+
+
+def timed(count):
+    start = time.perf_counter()
+    count()
+    return time.perf_counter() - start
+
+
+def run():
+    with open(OPERANDS_PATH, "r") as operands_file:
+        rxjs_operands = json.load(operands_file)["rxjs"]
+    matcher = PipeOperandMatcher(rxjs_operands.keys())
+    report = {}
+    for size in NEW_SIZES:
+        with tempfile.NamedTemporaryFile("w", suffix=".js", delete=False, encoding="utf-8") as f:
+            f.write(bundle(size))
+        try:
+            report[size] = {"pipe_matcher_s": timed(lambda: matcher.count_file(f.name))}
+            if size in OLD_SIZES:
+                operands = {"rxjs": {operand: {} for operand in rxjs_operands}}
+                report[size]["count_usage_rxjs_s"] = timed(lambda: count_usage_rxjs(f.name, operands, "bundle"))
+        finally:
+            os.remove(f.name)
+        print(f"{size // 1024} KB", {key: round(value, 3) for key, value in report[size].items()})
+    return report
+
+
+if __name__ == "__main__":
+    run()
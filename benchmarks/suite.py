@@ -0,0 +1,125 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from repositories_processing import (calculate_stats, count_usage_threaded, count_usage_unthreaded,  # noqa: E402
+                                     create_file_list_unthreaded)
+from synthetic_corpus import generate_corpus  # noqa: E402
+
+BENCHMARKS_PATH = os.path.dirname(os.path.abspath(__file__))
+RESULTS_PATH = os.path.join(BENCHMARKS_PATH, "results")
+BASELINE_PATH = os.path.join(RESULTS_PATH, "baseline.json")
+# corpus of every scale, per technology: repos, files per repo and bytes per file
+SCALES = {"small": {"repos": 4, "files": 25, "file_size": 2048},
+          "medium": {"repos": 8, "files": 100, "file_size": 4096},
+          "large": {"repos": 16, "files": 250, "file_size": 8192}}
+# the best of RUNS runs counts
+RUNS = 3
+# slower than the baseline by more than this share, and by at least MIN_DIFFERENCE seconds, is a regression
+REGRESSION_THRESHOLD = 0.1
+MIN_DIFFERENCE = 0.005
+# a fixed number of workers, so that results compare across machines with the same cores
+THREADED_JOBS = 2
+# in order, counting needs the index and the stats need the counts
+BENCHMARKS = {"index": create_file_list_unthreaded,
+              "count": lambda: count_usage_unthreaded(use_cache=False),
+              "count_threaded": lambda: count_usage_threaded(n_jobs=THREADED_JOBS, use_cache=False),
+              "stats": calculate_stats}
+
+
+def git_revision():
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCHMARKS_PATH, capture_output=True,
+                                  text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=BENCHMARKS_PATH,
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return f"{revision}-dirty" if dirty else revision
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def best_time(benchmark, runs=RUNS):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        # the progress the functions print is not part of the results
+        with contextlib.redirect_stdout(io.StringIO()):
+            benchmark()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def corpus_size(root):
+    files = 0
+    size = 0
+    for folder, _, names in os.walk(f"{root}/repos"):
+        files += len(names)
+        size += sum(os.path.getsize(f"{folder}/{name}") for name in names)
+    return {"files": files, "bytes": size}
+
+
+def run(scales, runs=RUNS, seed=0):
+    results = {"revision": git_revision(), "python": platform.python_version(), "machine": platform.machine(),
+               "cpus": os.cpu_count(), "runs": runs, "seed": seed, "corpus": {}, "seconds": {}}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as work_path:
+        for scale in scales:
+            root = generate_corpus(f"{work_path}/{scale}", seed, **SCALES[scale])
+            results["corpus"][scale] = corpus_size(root)
+            results["seconds"][scale] = {}
+            os.chdir(root)
+            try:
+                for name, benchmark in BENCHMARKS.items():
+                    results["seconds"][scale][name] = best_time(benchmark, runs)
+                    print(f"{scale} {name}: {results['seconds'][scale][name]:.4f}s")
+            finally:
+                os.chdir(cwd)
+    return results
+
+
+def regressions(results, baseline, threshold=REGRESSION_THRESHOLD):
+    '''[(scale, benchmark, baseline seconds, seconds)] of the benchmarks slower than in the baseline.'''
+    slower = []
+    for scale, benchmarks in results["seconds"].items():
+        for name, seconds in benchmarks.items():
+            before = baseline.get("seconds", {}).get(scale, {}).get(name)
+            if before is not None and seconds > before * (1 + threshold) and seconds - before > MIN_DIFFERENCE:
+                slower.append((scale, name, before, seconds))
+    return slower
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="index, count and stats benchmarks on synthetic corpora, offline")
+    parser.add_argument("scales", nargs="*", default=["small", "medium"], choices=list(SCALES))
+    parser.add_argument("--runs", type=int, default=RUNS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="results to compare with")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="share slower that fails")
+    parser.add_argument("--save-baseline", action="store_true", help="also keep these results as the baseline")
+    args = parser.parse_args()
+
+    results = run(args.scales, args.runs, args.seed)
+    os.makedirs(RESULTS_PATH, exist_ok=True)
+    with open(os.path.join(RESULTS_PATH, f"{results['revision']}.json"), "w") as results_file:
+        json.dump(results, results_file, indent=4)
+    if args.save_baseline:
+        with open(BASELINE_PATH, "w") as baseline_file:
+            json.dump(results, baseline_file, indent=4)
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, "r") as baseline_file:
+            baseline = json.load(baseline_file)
+        slower = regressions(results, baseline, args.threshold)
+        for scale, name, before, seconds in slower:
+            print(f"Regression: {scale} {name} {before:.4f}s -> {seconds:.4f}s ({seconds / before - 1:+.0%}) "
+                  f"against {baseline['revision']}")
+        if slower:
+            raise SystemExit(1)
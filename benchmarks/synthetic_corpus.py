@@ -0,0 +1,103 @@
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from repositories_processing import (FILE_EXTENSIONS, GRAY_LIST_PATH, OPERANDS_PATH, REPO_LIST_PATH,  # noqa: E402
+                                     TECHNOLOGIES)
+
+PACKAGE_OPERANDS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), OPERANDS_PATH)
+# source root of each technology, where get_files looks for java and kotlin files
+SOURCE_ROOTS = {"rxjava": "src/main/java", "rxkotlin": "src/main/kotlin", "rxjs": "src", "rxswift": "Sources",
+                "rxdart": "lib"}
+# folders that are walked but not indexed, or not walked at all
+EXCLUDED_ROOTS = {"rxjava": "src/test/java", "rxkotlin": "src/test/kotlin", "rxjs": "node_modules/lib",
+                  "rxswift": "Pods/Lib", "rxdart": "build/lib"}
+# every technology of FILE_EXTENSIONS, the counted ones first so that their files do not change with the others
+CORPUS_TECHNOLOGIES = TECHNOLOGIES + [technology for technology in FILE_EXTENSIONS if technology not in TECHNOLOGIES]
+STATEMENT_ENDS = {"java": ";", "cs": ";", "js": ";", "ts": ";", "dart": ";", "kt": "", "swift": ""}
+
+
+def source_line(rnd, extension, operands, operand_density):
+    # an operand call with probability operand_density, otherwise code, a comment or a string with a call in it
+    end = STATEMENT_ENDS[extension]
+    if rnd.random() < operand_density:
+        return f"        value{rnd.randrange(100)} = source{rnd.randrange(100)}.{rnd.choice(operands)}(item){end}"
+    kind = rnd.randrange(4)
+    if kind == 0:
+        return f"        // value{rnd.randrange(100)}.{rnd.choice(operands)}(later)"
+    if kind == 1:
+        return f'        label{rnd.randrange(100)} = "call .{rnd.choice(operands)}(x) in text"{end}'
+    return f"        total{rnd.randrange(100)} = total{rnd.randrange(100)} + {rnd.randrange(1000)}{end}"
+
+
+def source_file(rnd, extension, operands, file_size, operand_density):
+    lines = [f"// benchmark sample, {extension}", "class Sample {"]
+    size = sum(len(line) + 1 for line in lines)
+    while size < file_size:
+        line = source_line(rnd, extension, operands, operand_density)
+        lines.append(line)
+        size += len(line) + 1
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def generate_corpus(root, seed=0, repos=4, files=25, file_size=2048, depth=3, operand_density=0.2,
+                    technologies=CORPUS_TECHNOLOGIES, forks=0):
+    '''Writes a deterministic repos/<technology>/<owner>_<name> tree under root, for every extension of
+    FILE_EXTENSIONS, with the operands.json, repo_list.json and gray_list.json the counting reads. The last repo of
+    every technology is left out of repo_list.json and the one before is blacklisted, like in a real gray list. A
+    tenth of the files go to folders that are excluded from the index. The first forks repos of every technology
+    also get an identical copy, fork<index>_<technology><index>, in repo_list.json.'''
+    rnd = random.Random(seed)
+    shutil.rmtree(root, ignore_errors=True)
+    os.makedirs(f"{root}/indexes")
+    with open(PACKAGE_OPERANDS_PATH, "r") as operands_file:
+        all_operands = json.load(operands_file)
+    with open(f"{root}/{OPERANDS_PATH}", "w") as operands_file:
+        json.dump(all_operands, operands_file)
+    repo_list = {}
+    blacklist = []
+    for technology in technologies:
+        operands = sorted(all_operands[technology])
+        projects = [f"owner{index}_{technology}{index}" for index in range(repos)]
+        repo_list[technology] = projects[:-1]
+        if len(projects) > 2:
+            blacklist.append(projects[-2])
+        for project in projects:
+            for index in range(files):
+                extension = rnd.choice(FILE_EXTENSIONS[technology])
+                source_root = EXCLUDED_ROOTS[technology] if index % 10 == 9 else SOURCE_ROOTS[technology]
+                folders = [f"module{rnd.randrange(4)}" for _ in range(rnd.randint(0, depth))]
+                folder = "/".join([root, "repos", technology, project, source_root] + folders)
+                os.makedirs(folder, exist_ok=True)
+                with open(f"{folder}/File{index}.{extension}", "w", encoding="utf-8", newline="\n") as source:
+                    source.write(source_file(rnd, extension, operands, file_size, operand_density))
+        for index, project in enumerate(projects[:forks]):
+            fork = f"fork{index}_{technology}{index}"
+            shutil.copytree(f"{root}/repos/{technology}/{project}", f"{root}/repos/{technology}/{fork}")
+            repo_list[technology].append(fork)
+    with open(f"{root}/{REPO_LIST_PATH}", "w") as repo_list_file:
+        json.dump(repo_list, repo_list_file, indent=4)
+    with open(f"{root}/{GRAY_LIST_PATH}", "w") as gray_list_file:
+        json.dump({"blacklist": blacklist}, gray_list_file, indent=4)
+    return root
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="deterministic synthetic corpus for the benchmarks")
+    parser.add_argument("root")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repos", type=int, default=4, help="per technology")
+    parser.add_argument("--files", type=int, default=25, help="per repo")
+    parser.add_argument("--file-size", type=int, default=2048, help="in bytes")
+    parser.add_argument("--depth", type=int, default=3, help="most folders under the source root")
+    parser.add_argument("--operand-density", type=float, default=0.2, help="share of lines calling an operand")
+    parser.add_argument("--forks", type=int, default=0, help="repos copied as forks, per technology")
+    args = parser.parse_args()
+    generate_corpus(args.root, args.seed, args.repos, args.files, args.file_size, args.depth, args.operand_density,
+                    forks=args.forks)
@@ -0,0 +1,66 @@
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from repositories_processing import OPERANDS_PATH, count_word  # noqa: E402
+from usage_scanner import OperandMatcher, extension_of  # noqa: E402
+
+FIXTURES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "tokenizer")
+# every fixture is repeated up to about this size for the throughput runs
+THROUGHPUT_BYTES = 2 * 1024 * 1024
+RUNS = 3
+
+
+def errors(counts, expected):
+    # calls counted that are not there plus calls missed
+    return sum(abs(counts[operand] - expected.get(operand, 0)) for operand in set(counts) | set(expected))
+
+
+def throughput(count, text):
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        count(text)
+    return len(text.encode("utf-8")) * RUNS / (time.perf_counter() - start) / 1e6
+
+
+def count_words(operands, text, technology):
+    # the original path: one count_word, and one read of the file, per operand
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False, encoding="utf-8") as f:
+        f.write(text)
+    try:
+        return {operand: count_word(operand, f.name, technology) for operand in operands}
+    finally:
+        os.remove(f.name)
+
+
+def run():
+    with open(OPERANDS_PATH, "r") as operands_file:
+        operands = json.load(operands_file)
+    with open(os.path.join(FIXTURES_PATH, "expected.json"), "r") as expected_file:
+        fixtures = json.load(expected_file)
+    report = {}
+    for fixture, expected in fixtures.items():
+        technology = expected["technology"]
+        extension = extension_of(fixture)
+        with open(os.path.join(FIXTURES_PATH, fixture), "r", encoding="utf-8") as fixture_file:
+            text = fixture_file.read()
+        regex = OperandMatcher(operands[technology])
+        tokenizer = OperandMatcher(operands[technology], tokenize=True)
+        large_text = text * max(THROUGHPUT_BYTES // len(text), 1)
+        report[fixture] = {
+            "regex_errors": errors(regex.count_text(text, extension), expected["counts"]),
+            "tokenizer_errors": errors(tokenizer.count_text(text, extension), expected["counts"]),
+            "count_word_mb_s": throughput(lambda t: count_words(operands[technology], t, technology),
+                                          large_text[:THROUGHPUT_BYTES // 8]),
+            "regex_mb_s": throughput(lambda t: regex.count_text(t, extension), large_text),
+            "tokenizer_mb_s": throughput(lambda t: tokenizer.count_text(t, extension), large_text)}
+        print(fixture, {key: round(value, 1) for key, value in report[fixture].items()})
+    return report
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,128 @@
+import os
+from collections import Counter
+
+import git
+
+from file_ingest import FileReader
+
+SUBMODULE_MODE = 0o160000
+
+
+def iter_source_blobs(repo, rev="HEAD", path_filter=None, prefix="", pruned_folders=()):
+    tree = repo.commit(rev).tree
+    for blob in tree.traverse(predicate=lambda item, depth: item.type == "blob",
+                              prune=lambda item, depth: item.type == "tree" and item.name in pruned_folders):
+        if path_filter is None or path_filter(f"{prefix}{blob.path}"):
+            yield blob
+
+
+def repo_size(repo_path):
+    # bytes of the git objects of a clone, bare or not, as a guess of how long it takes to scan
+    objects_path = f"{repo_path}/.git/objects" if os.path.isdir(f"{repo_path}/.git") else f"{repo_path}/objects"
+    size = 0
+    for folder, _, names in os.walk(objects_path):
+        for name in names:
+            try:
+                size += os.path.getsize(f"{folder}/{name}")
+            except OSError:
+                pass
+    return size
+
+
+def scan_repo_blobs(matcher, repo_path, rev="HEAD", path_filter=None, prefix="", pruned_folders=(), blob_counts=None,
+                    reader=None):
+    '''Operand usage of the source files of a clone (bare or not) at rev, read from the git objects instead of the
+    working tree. Returns (Counter, number of blobs scanned, reader). blob_counts maps blob ids to counts already
+    known.'''
+    blob_counts = {} if blob_counts is None else blob_counts
+    reader = FileReader() if reader is None else reader
+    counts = Counter()
+    total_blobs = 0
+    try:
+        repo = git.Repo(repo_path)
+    except (git.exc.InvalidGitRepositoryError, git.exc.NoSuchPathError) as e:
+        print(f"Not a repository: {repo_path} {e}")
+        return counts, total_blobs, reader
+    try:
+        for blob in iter_source_blobs(repo, rev, path_filter, prefix, pruned_folders):
+            blob_count = blob_counts.get(blob.hexsha)
+            if blob_count is None:
+                blob_count = reader.count_blob(matcher, f"{prefix}{blob.path}", blob)
+                blob_counts[blob.hexsha] = blob_count
+            counts.update(blob_count)
+            total_blobs += 1
+    except (git.exc.BadName, ValueError) as e:
+        # unknown revision or empty repository
+        print(f"No {rev} in {repo_path}: {e}")
+    finally:
+        repo.close()
+    return counts, total_blobs, reader
+
+
+def sample_commits(repo, rev="HEAD", samples=12, by="count"):
+    '''Commits to snapshot, oldest first and always ending at rev: "count" spreads samples evenly along the first
+    parent history, "month" takes the last commit of every month and "tag" the tagged commits.'''
+    head = repo.commit(rev)
+    if by == "tag":
+        tagged = {tag.commit.hexsha: tag.commit for tag in repo.tags}
+        tagged.pop(head.hexsha, None)
+        return sorted(tagged.values(), key=lambda commit: commit.committed_date) + [head]
+    history = list(repo.iter_commits(rev, first_parent=True))[::-1]
+    if by == "month":
+        last_of_month = {}
+        for commit in history:
+            last_of_month[commit.committed_datetime.strftime("%Y-%m")] = commit
+        return [commit for month, commit in sorted(last_of_month.items()) if commit != head] + [head]
+    if samples <= 1 or len(history) <= samples:
+        return history[-samples:] if samples >= 1 else [head]
+    return [history[round(i * (len(history) - 1) / (samples - 1))] for i in range(samples)]
+
+
+def scan_history(matcher, repo_path, rev="HEAD", samples=12, by="count", path_filter=None, prefix="",
+                 pruned_folders=(), reader=None):
+    '''Operand usage at every sampled commit, as [(commit id, commit date, Counter, number of files)], with the reader.
+    Only the blobs that a tree diff reports as changed since the previous sample are looked at, and blobs are never
+    scanned twice. A path that is not a repository, or has no rev, has an empty history.'''
+    blob_counts = {}
+    reader = FileReader() if reader is None else reader
+    history = []
+    try:
+        repo = git.Repo(repo_path)
+    except (git.exc.InvalidGitRepositoryError, git.exc.NoSuchPathError) as e:
+        print(f"Not a repository: {repo_path} {e}")
+        return history, reader
+    try:
+        file_blobs = None
+        previous = None
+        for commit in sample_commits(repo, rev, samples, by):
+            if file_blobs is None:
+                file_blobs = {}
+                for blob in iter_source_blobs(repo, commit, path_filter, prefix, pruned_folders):
+                    file_blobs[blob.path] = blob.hexsha
+                    if blob.hexsha not in blob_counts:
+                        blob_counts[blob.hexsha] = reader.count_blob(matcher, f"{prefix}{blob.path}", blob)
+            else:
+                for diff in previous.diff(commit):
+                    if diff.change_type != "A":
+                        file_blobs.pop(diff.a_path, None)
+                    if diff.change_type == "D" or diff.b_mode == SUBMODULE_MODE:
+                        continue
+                    if path_filter is not None and not path_filter(f"{prefix}{diff.b_path}"):
+                        continue
+                    if any(folder in pruned_folders for folder in diff.b_path.split("/")[:-1]):
+                        continue
+                    file_blobs[diff.b_path] = diff.b_blob.hexsha
+                    if diff.b_blob.hexsha not in blob_counts:
+                        blob_counts[diff.b_blob.hexsha] = reader.count_blob(matcher, f"{prefix}{diff.b_path}",
+                                                                            diff.b_blob)
+            counts = Counter()
+            for hexsha in file_blobs.values():
+                counts.update(blob_counts[hexsha])
+            history.append((commit.hexsha, commit.committed_datetime, counts, len(file_blobs)))
+            previous = commit
+    except (git.exc.BadName, ValueError) as e:
+        # unknown revision or empty repository, the snapshots taken so far are kept
+        print(f"No {rev} in {repo_path}: {e}")
+    finally:
+        repo.close()
+    return history, reader
@@ -0,0 +1,59 @@
+import json
+import os
+from datetime import datetime
+
+
+def read_journal(path):
+    # the records of an append only JSON lines file, none if it does not exist yet
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as journal_file:
+        for line in journal_file:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # last line of a crashed run
+                continue
+
+
+def open_journal(path):
+    # opened to append records on a line of their own, after the last line of a crashed run
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    crashed = False
+    if os.path.exists(path) and os.path.getsize(path):
+        with open(path, "rb") as journal_file:
+            journal_file.seek(-1, os.SEEK_END)
+            crashed = journal_file.read() != b"\n"
+    journal_file = open(path, "a", encoding="utf-8")
+    if crashed:
+        journal_file.write("\n")
+    return journal_file
+
+
+class CloneJournal:
+    '''Append only log of the state of every repository to clone (pending, done or failed), so that an interrupted
+    clone run can resume. The last line written for a repository is its current state.'''
+    PENDING = "pending"
+    DONE = "done"
+    FAILED = "failed"
+
+    def __init__(self, path) -> None:
+        self.path = path
+        self.states = {}
+        for entry in read_journal(path):
+            self.states[entry["repo"]] = entry
+        self.journal_file = open_journal(path)
+
+    def state(self, repo):
+        entry = self.states.get(repo)
+        return entry["state"] if entry else None
+
+    def record(self, repo, state, reason=None):
+        entry = {"repo": repo, "state": state, "reason": reason, "time": datetime.now().isoformat()}
+        self.states[repo] = entry
+        self.journal_file.write(json.dumps(entry) + "\n")
+        self.journal_file.flush()
+        os.fsync(self.journal_file.fileno())
+
+    def close(self):
+        self.journal_file.close()
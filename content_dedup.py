@@ -0,0 +1,123 @@
+import json
+import os
+from collections import Counter
+
+from joblib import Parallel, delayed
+
+from file_ingest import open_source
+from usage_cache import hash_content
+from usage_scanner import project_of, shard
+
+# content hash of every indexed file of a technology, as {file: [content hash, size, mtime_ns]}
+BLOB_INDEX_PATH = "indexes/{technology}_blobs.json"
+# files per task handed to a worker by create_blob_index
+HASH_SHARD_SIZE = 1000
+
+
+def hash_files(files, previous=None, repos_path="repos"):
+    '''{file: [content hash, size, mtime_ns]} of files, reusing the entries of previous that kept their size and
+    mtime.'''
+    previous = previous or {}
+    entries = {}
+    for file in files:
+        try:
+            stat = os.stat(f"{repos_path}/{file}")
+            entry = previous.get(file)
+            if entry and entry[1:] == [stat.st_size, stat.st_mtime_ns]:
+                entries[file] = entry
+                continue
+            with open_source(f"{repos_path}/{file}") as (data, stat):
+                entries[file] = [hash_content(data), stat.st_size, stat.st_mtime_ns]
+        except FileNotFoundError:
+            continue
+    return entries
+
+
+def load_blob_index(technology):
+    index_path = BLOB_INDEX_PATH.format(technology=technology)
+    if not os.path.exists(index_path):
+        return {}
+    with open(index_path, "r", encoding="utf-8") as index_file:
+        return json.load(index_file)
+
+
+def create_blob_index(technology, n_jobs=-1, repos_path="repos"):
+    # hashes the files of the index of technology, only the ones that changed since the last blob index
+    with open(f"indexes/{technology}.txt", "r", encoding="utf-8") as file_list_file:
+        files = sorted(set(x for x in file_list_file.read().split("\n") if x))
+    previous = load_blob_index(technology)
+    results = Parallel(n_jobs=n_jobs)(delayed(hash_files)(file_shard,
+                                                          {file: previous[file] for file in file_shard
+                                                           if file in previous}, repos_path)
+                                      for file_shard in shard(files, HASH_SHARD_SIZE))
+    entries = {}
+    for result in results:
+        entries.update(result)
+    with open(BLOB_INDEX_PATH.format(technology=technology), "w+", encoding="utf-8") as index_file:
+        json.dump(entries, index_file, sort_keys=True)
+    return entries
+
+
+def unique_blobs(files, blob_index, repos_path="repos"):
+    '''Groups files by content, as {representative: [files]} with the representative first. Files missing from the
+    blob index, or changed since it was made, are a group of their own.'''
+    representatives = {}
+    groups = {}
+    for file in files:
+        key = file
+        entry = blob_index.get(file)
+        if entry:
+            try:
+                stat = os.stat(f"{repos_path}/{file}")
+                if entry[1:] == [stat.st_size, stat.st_mtime_ns]:
+                    key = entry[0]
+            except FileNotFoundError:
+                pass
+        groups.setdefault(representatives.setdefault(key, file), []).append(file)
+    return groups
+
+
+def fan_out(groups, file_counts):
+    # the counts of every representative given to the rest of its group
+    return {file: file_counts.get(representative, Counter())
+            for representative, files in groups.items() for file in files}
+
+
+def duplicate_results(groups, file_counts, kinds, blob_index):
+    '''The files of groups that were not scanned, as scan_changed_files results with the counts and kind of their
+    representative, for UsageCache.update.'''
+    return [(file, blob_index[file][1], blob_index[file][2], blob_index[file][0],
+             file_counts.get(representative, Counter()), kinds.get(representative))
+            for representative, files in groups.items() for file in files[1:]]
+
+
+def duplicate_repos(technology, blob_index, threshold, projects=None):
+    '''{repo: repo it duplicates} of the repos, forks or copies, with at least threshold of their distinct blobs in a
+    larger repo that is kept. Repos are kept from the largest, by distinct blobs, down, and in the order of projects
+    (like the search ranking of repo_list.json) when as large, so that the original is kept rather than a fork.'''
+    rank = {project: index for index, project in enumerate(projects)} if projects is not None else {}
+    blobs = {}
+    for file, (content_hash, _, _) in blob_index.items():
+        project = project_of(file, technology)
+        if projects is None or project in rank:
+            blobs.setdefault(project, set()).add(content_hash)
+    holders = {}
+    for project, hashes in blobs.items():
+        for content_hash in hashes:
+            holders.setdefault(content_hash, []).append(project)
+    shared = {project: Counter() for project in blobs}
+    for projects_of_blob in holders.values():
+        for project in projects_of_blob:
+            for other in projects_of_blob:
+                if other != project:
+                    shared[project][other] += 1
+    kept = []
+    duplicates = {}
+    for project in sorted(blobs, key=lambda name: (-len(blobs[name]), rank.get(name, len(rank)), name)):
+        original = max(kept, key=lambda name: shared[project][name], default=None)
+        if original is not None and shared[project][original] and \
+                shared[project][original] >= threshold * len(blobs[project]):
+            duplicates[project] = original
+        else:
+            kept.append(project)
+    return duplicates
@@ -0,0 +1,152 @@
+import contextlib
+import hashlib
+import math
+import mmap
+import os
+import re
+import time
+from collections import Counter
+
+from instrumentation import Metrics
+
+# files from this size on are memory mapped and scanned as bytes, decoding only the calls with non ASCII characters,
+# instead of read and decoded whole
+MMAP_THRESHOLD = 1024 * 1024
+# larger files are "oversized"
+MAX_FILE_SIZE = 16 * 1024 * 1024
+# the start of a file, where generated headers and minified lines show
+SNIFF_SIZE = 8192
+MINIFIED_SUFFIXES = (".min.js", ".min.mjs", ".bundle.js", "-bundle.js")
+# minified code is long lines of dense text: hand written code averages under 50 characters a line and 4.5 to 5 bits
+# of entropy a byte, long lines of lower entropy are usually data tables
+MINIFIED_LINE_LENGTH = 500
+MINIFIED_ENTROPY = 5.0
+GENERATED_MARKERS = re.compile(rb"@generated|<auto-generated|\bDO NOT EDIT\b|\bauto-?generated\b|"
+                               rb"\b(?:this|the) (?:file|code) (?:was|is) (?:automatically )?generated\b", re.I)
+# "scan" counts every file like before, "skip" leaves minified, generated and oversized files out of the counts and
+# "tag" counts them but lists them, with their kind
+POLICIES = ("scan", "skip", "tag")
+
+
+def extension_of(path):
+    name = path.rpartition("/")[2]
+    return name.rpartition(".")[2] if "." in name else None
+
+
+def entropy(data):
+    # bits per byte
+    total = len(data)
+    return -sum(count / total * math.log2(count / total) for count in Counter(data).values()) if total else 0.0
+
+
+def classify(path, size, head, max_size=MAX_FILE_SIZE):
+    '''"oversized", "generated", "minified" or None for a file of size bytes starting with head.'''
+    if size > max_size:
+        return "oversized"
+    if GENERATED_MARKERS.search(head):
+        return "generated"
+    if path.endswith(MINIFIED_SUFFIXES):
+        return "minified"
+    if len(head) / (head.count(b"\n") + 1) > MINIFIED_LINE_LENGTH and entropy(head) >= MINIFIED_ENTROPY:
+        return "minified"
+    return None
+
+
+@contextlib.contextmanager
+def open_source(path_file, mmap_threshold=MMAP_THRESHOLD):
+    # (bytes or read only mmap, os.stat_result), the mmap only valid inside the with block
+    with open(path_file, "rb") as f:
+        stat = os.fstat(f.fileno())
+        if stat.st_size >= max(mmap_threshold, 1):
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                yield buffer, stat
+        else:
+            yield f.read(), stat
+
+
+class FileReader:
+    '''Reads the files to count, applying the policy to minified, generated and oversized ones, and keeps the stats
+    of the run. Workers get a copy each, merged back into the reader of the run.'''
+
+    def __init__(self, policy="scan", max_size=MAX_FILE_SIZE, mmap_threshold=MMAP_THRESHOLD) -> None:
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy {policy}, expected one of {POLICIES}")
+        self.policy = policy
+        self.max_size = max_size
+        self.mmap_threshold = mmap_threshold
+        self.stats = Counter()
+        # {file: kind} of the files tagged or skipped
+        self.flagged = {}
+        # scan time of every file and repo
+        self.metrics = Metrics()
+
+    def empty_copy(self):
+        # for a worker, that reports only its own stats
+        return FileReader(self.policy, self.max_size, self.mmap_threshold)
+
+    def fingerprint(self, matcher):
+        # with "scan" the counts are only the matcher's, so cached counts stay valid
+        if self.policy == "scan":
+            return matcher.fingerprint
+        return hashlib.sha1(f"{matcher.fingerprint}\n{self.policy}\n{self.max_size}\n{MINIFIED_LINE_LENGTH}\n"
+                            f"{MINIFIED_ENTROPY}\n{GENERATED_MARKERS.pattern}".encode()).hexdigest()
+
+    def admit(self, file, size, head):
+        '''Whether to count a file, recording it in the stats. head is only looked at when the policy needs it.'''
+        kind = classify(file, size, head, self.max_size) if self.policy != "scan" else None
+        if kind is not None:
+            self.flagged[file] = kind
+            self.stats[f"{kind}_files"] += 1
+            if self.policy == "skip":
+                self.stats["skipped_files"] += 1
+                self.stats["skipped_bytes"] += size
+                return False
+        self.stats["scanned_files"] += 1
+        self.stats["scanned_bytes"] += size
+        return True
+
+    def count_data(self, matcher, file, data):
+        # data is bytes, or a mmap that is counted without decoding it
+        if not self.admit(file, len(data), data[:SNIFF_SIZE]):
+            return Counter()
+        start = time.perf_counter()
+        if isinstance(data, mmap.mmap):
+            self.stats["mapped_files"] += 1
+            counts = matcher.count_buffer(data, extension_of(file))
+        else:
+            counts = matcher.count_bytes(data, extension_of(file))
+        seconds = time.perf_counter() - start
+        self.metrics.add_time("scan_file", seconds, file)
+        # "<technology>/<project>"
+        self.metrics.add_total("scan_repo", "/".join(file.split("/")[:2]), seconds)
+        return counts
+
+    def count_file(self, matcher, path_file, file=None):
+        try:
+            with open_source(path_file, self.mmap_threshold) as (data, _):
+                return self.count_data(matcher, file or path_file, data)
+        except FileNotFoundError:
+            return Counter()
+
+    def count_blob(self, matcher, file, blob):
+        # oversized git blobs are skipped without reading them
+        if self.policy == "skip" and blob.size > self.max_size:
+            self.admit(file, blob.size, b"")
+            return Counter()
+        return self.count_data(matcher, file, blob.data_stream.read())
+
+    def merge(self, other):
+        self.stats.update(other.stats)
+        self.flagged.update(other.flagged)
+        self.metrics.merge(other.metrics)
+
+    def report(self):
+        stats = self.stats
+        print(f"Scanned {stats['scanned_files']} files ({stats['scanned_bytes'] / 1e6:.1f} MB, "
+              f"{stats['mapped_files']} memory mapped), skipped {stats['skipped_files']} files "
+              f"({stats['skipped_bytes'] / 1e6:.1f} MB), {stats['cached_files']} files from the cache, "
+              f"{stats['duplicate_files']} duplicates of a scanned file")
+        if self.policy != "scan":
+            print(f"{self.policy}: {stats['minified_files']} minified, {stats['generated_files']} generated, "
+                  f"{stats['oversized_files']} oversized")
+        return dict(stats)
@@ -0,0 +1,156 @@
+import datetime
+import time
+from collections import Counter
+
+import requests
+
+from instrumentation import METRICS
+from search_planner import SEARCH_LIMIT
+
+API_URL = "https://api.github.com"
+GRAPHQL_URL = "https://api.github.com/graphql"
+SEARCH_PAGE_SIZE = 100
+GRAPHQL_BATCH_SIZE = 100
+MAX_RETRIES = 5
+# seconds, doubled on every retry
+SECONDARY_LIMIT_WAIT = 60
+# (calls, seconds) allowed per token for every rate limit resource
+RATE_LIMITS = {"search": (30, 60),
+               "core": (5000, 3600),
+               "graphql": (5000, 3600)}
+# what the body of a 403 from a secondary (or, in older messages, abuse) rate limit says
+SECONDARY_LIMIT_MESSAGES = ("secondary rate limit", "abuse")
+SUBSCRIBERS_QUERY = "query($ids: [ID!]!) { nodes(ids: $ids) { ... on Repository { id watchers { totalCount } } } }"
+
+
+def is_rate_limited(response):
+    # 403 is also a plain permission error, that no retry fixes
+    if response.status_code == 429 or "Retry-After" in response.headers:
+        return True
+    if response.status_code != 403:
+        return False
+    if response.headers.get("X-RateLimit-Remaining") == "0":
+        return True
+    return any(message in response.text.lower() for message in SECONDARY_LIMIT_MESSAGES)
+
+
+class RateLimitTracker:
+    '''Remaining calls and reset time of every rate limit resource (core, search, graphql), as reported by the
+    headers of the last response of that resource, so that no call is spent asking for them.'''
+
+    def __init__(self) -> None:
+        self.limits = {}
+
+    def update(self, headers):
+        resource = headers.get("X-RateLimit-Resource")
+        if resource and "X-RateLimit-Remaining" in headers:
+            self.limits[resource] = (int(headers["X-RateLimit-Remaining"]), int(headers["X-RateLimit-Reset"]))
+
+    def wait_time(self, resource):
+        remaining, reset = self.limits.get(resource, (1, 0))
+        return max(reset - time.time(), 0) if remaining == 0 else 0
+
+    def wait(self, resource):
+        wait_time = self.wait_time(resource)
+        if wait_time:
+            print(f'Now: {datetime.datetime.now()}\nWait for {resource}: {int(wait_time / 3600)} hours, '
+                  f'{int(wait_time / 60) % 60} minutes, {int(wait_time % 60)} seconds.')
+            time.sleep(wait_time + 1)
+            METRICS.add_time("api_wait", wait_time + 1, resource)
+
+
+class TokenBucket:
+    '''Paces the calls of one token to one rate limit resource, corrected by the rate limit headers it gets back.'''
+
+    def __init__(self, capacity, period) -> None:
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self):
+        self.refill()
+        blocked = max(self.blocked_until - time.time(), 0)
+        return max(blocked, 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate)
+
+    def take(self):
+        self.refill()
+        self.tokens -= 1
+
+    def sync(self, remaining, reset):
+        self.refill()
+        self.tokens = min(self.tokens, remaining)
+        self.blocked_until = reset if remaining == 0 else 0
+
+
+class GithubApi:
+    '''The few GitHub calls the search needs, returning the raw payloads.'''
+
+    def __init__(self, token=None, session=None) -> None:
+        # the session can be shared by several tokens, so the headers go with every request
+        self.session = session if session is not None else requests.Session()
+        self.headers = {"Accept": "application/vnd.github+json"}
+        if token:
+            self.headers["Authorization"] = f"token {token.strip()}"
+        self.rate_limits = RateLimitTracker()
+        self.calls = Counter()
+
+    def request(self, method, url, resource, **kwargs):
+        retries = 0
+        while True:
+            self.rate_limits.wait(resource)
+            with METRICS.timer(f"api_{resource}"):
+                response = self.session.request(method, url, headers=self.headers, **kwargs)
+            self.calls[resource] += 1
+            self.rate_limits.update(response.headers)
+            if response.status_code in (403, 429) and retries < MAX_RETRIES and is_rate_limited(response):
+                retries += 1
+                METRICS.count(f"api_{resource}_retries")
+                if "Retry-After" in response.headers:
+                    time.sleep(int(response.headers["Retry-After"]))
+                    METRICS.add_time("api_wait", int(response.headers["Retry-After"]), resource)
+                    continue
+                if response.headers.get("X-RateLimit-Remaining") == "0":
+                    continue
+                # secondary rate limit without a Retry-After
+                time.sleep(SECONDARY_LIMIT_WAIT * 2 ** (retries - 1))
+                METRICS.add_time("api_wait", SECONDARY_LIMIT_WAIT * 2 ** (retries - 1), resource)
+                continue
+            response.raise_for_status()
+            return response.json()
+
+    def search_repositories(self, query, page=1, per_page=SEARCH_PAGE_SIZE):
+        data = self.request("GET", f"{API_URL}/search/repositories", "search",
+                            params={"q": query, "sort": "stars", "order": "desc", "per_page": per_page, "page": page})
+        return data["total_count"], data["items"]
+
+    def count(self, query):
+        return self.search_repositories(query, per_page=1)[0]
+
+    def iter_search_pages(self, query, total):
+        for page in range(1, -(-min(total, SEARCH_LIMIT) // SEARCH_PAGE_SIZE) + 1):
+            _, items = self.search_repositories(query, page)
+            if not items:
+                break
+            yield items
+
+    def subscribers_counts(self, node_ids):
+        # watchers in GraphQL are the subscribers of the REST API. GraphQL needs a token, without one the
+        # subscribers are left unknown
+        subscribers = {}
+        if "Authorization" not in self.headers:
+            return subscribers
+        for start in range(0, len(node_ids), GRAPHQL_BATCH_SIZE):
+            data = self.request("POST", GRAPHQL_URL, "graphql",
+                                json={"query": SUBSCRIBERS_QUERY,
+                                      "variables": {"ids": node_ids[start:start + GRAPHQL_BATCH_SIZE]}})
+            for node in (data.get("data") or {}).get("nodes") or []:
+                if node:
+                    subscribers[node["id"]] = node["watchers"]["totalCount"]
+        return subscribers
@@ -0,0 +1,138 @@
+import contextlib
+import cProfile
+import functools
+import heapq
+import json
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+RUN_REPORT_PATH = "indexes/run_report.json"
+# slowest files, repos, clones... kept per timer
+SLOWEST_ITEMS = 20
+
+
+class Metrics:
+    '''Timers, counters and the slowest items of a run. A timing is a perf_counter call and a heap push, cheap enough
+    to leave on for every file. Worker processes keep their own and hand them back to be merged.'''
+
+    def __init__(self) -> None:
+        self.started = datetime.now().isoformat()
+        # {name: [calls, seconds]}
+        self.timers = {}
+        self.counters = Counter()
+        # {name: heap of (seconds, item)} with the SLOWEST_ITEMS slowest items
+        self.slowest = {}
+        # {name: Counter(item: seconds)}, for items timed in parts, like the files of a repo
+        self.totals = {}
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def add_time(self, name, seconds, item=None, calls=1):
+        with self.lock:
+            timer = self.timers.setdefault(name, [0, 0.0])
+            timer[0] += calls
+            timer[1] += seconds
+            if item is not None:
+                self.keep_slowest(name, seconds, item)
+
+    def keep_slowest(self, name, seconds, item):
+        slowest = self.slowest.setdefault(name, [])
+        if len(slowest) < SLOWEST_ITEMS:
+            heapq.heappush(slowest, (seconds, item))
+        elif seconds > slowest[0][0]:
+            heapq.heapreplace(slowest, (seconds, item))
+
+    def add_total(self, name, item, seconds):
+        with self.lock:
+            self.totals.setdefault(name, Counter())[item] += seconds
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    @contextlib.contextmanager
+    def timer(self, name, item=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start, item)
+
+    def merge(self, other):
+        for name, (calls, seconds) in other.timers.items():
+            self.add_time(name, seconds, calls=calls)
+        with self.lock:
+            for name, slowest in other.slowest.items():
+                for seconds, item in slowest:
+                    self.keep_slowest(name, seconds, item)
+            for name, totals in other.totals.items():
+                self.totals.setdefault(name, Counter()).update(totals)
+            self.counters.update(other.counters)
+
+    def report(self):
+        '''The run as a JSON serializable dict, with the throughput of the file scans.'''
+        timers = {name: {"calls": calls, "seconds": round(seconds, 6), "mean": round(seconds / calls, 6)}
+                  for name, (calls, seconds) in sorted(self.timers.items())}
+        slowest = {name: [[item, round(seconds, 6)] for seconds, item in sorted(items, reverse=True)]
+                   for name, items in sorted(self.slowest.items())}
+        for name, totals in sorted(self.totals.items()):
+            slowest[name] = [[item, round(seconds, 6)] for item, seconds in totals.most_common(SLOWEST_ITEMS)]
+        report = {"started": self.started, "finished": datetime.now().isoformat(), "timers": timers,
+                  "counters": dict(sorted(self.counters.items())), "slowest": slowest}
+        scan_seconds = self.timers.get("scan_file", [0, 0.0])[1]
+        if scan_seconds:
+            # per second of scanning, summed over the workers
+            report["files_per_second"] = self.counters["scanned_files"] / scan_seconds
+            report["mb_per_second"] = self.counters["scanned_bytes"] / 1e6 / scan_seconds
+        return report
+
+
+# the metrics of this process
+METRICS = Metrics()
+
+
+def timed(name):
+    # decorator adding every call of a function to the METRICS timer name
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with METRICS.timer(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def save_run_report(path=RUN_REPORT_PATH, metrics=METRICS, **extra):
+    report = metrics.report()
+    report.update(extra)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w+") as report_file:
+        json.dump(report, report_file, indent=4)
+    return report
+
+
+@contextlib.contextmanager
+def profiled(path=None):
+    # cProfile dump of the calling thread to path, nothing without a path
+    if not path:
+        yield
+        return
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        profile.dump_stats(path)
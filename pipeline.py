@@ -0,0 +1,296 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+
+from content_dedup import BLOB_INDEX_PATH, create_blob_index
+from file_ingest import MAX_FILE_SIZE, POLICIES, FileReader
+from instrumentation import METRICS, profiled, save_run_report
+from repositories_processing import (CLONE_MODES, CLONE_WORKERS, FILE_EXTENSIONS, GRAY_LIST_PATH, OPERANDS_PATH,
+                                     PRUNED_FOLDERS, REPO_LIST_PATH, SOURCE_FOLDERS, STATS_CSV, STATS_PATH,
+                                     TECHNOLOGIES, UNUSED_CSV, UNUSED_PATH, USAGE_CSV, USAGE_HISTORY_CSV, USAGE_PATH,
+                                     USAGE_STORE_PATH, clone_repos, count_usage_git_all, count_usage_history,
+                                     count_usage_threaded, count_usage_unthreaded, create_file_list, process_usage)
+from repositories_searching import search_technologies
+from usage_store import INDEX_FILE
+from windows_inhibitor import WindowsInhibitor
+
+# config hash of the last successful run of every stage
+PIPELINE_STATE_PATH = "indexes/pipeline_state.json"
+COUNT_MODES = ["threaded", "unthreaded", "git"]
+# how the history target picks the commits of every clone, see sample_commits
+SAMPLE_BY = ["count", "month", "tag"]
+
+
+class Stage:
+    '''One step of the pipeline. It is up to date, and skipped, while all of its outputs exist and are newer than all
+    of its inputs, and its config is the one it last ran with.'''
+
+    def __init__(self, name, run, inputs=(), outputs=(), depends=(), config=None) -> None:
+        self.name = name
+        self.run = run
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.depends = list(depends)
+        self.config = config or {}
+
+    def config_hash(self):
+        return hashlib.sha1(json.dumps(self.config, sort_keys=True, default=str).encode()).hexdigest()
+
+    def is_fresh(self, config_hash):
+        # without a config hash the stage never ran in the pipeline, and outputs made by hand are judged by mtime only
+        if config_hash not in (None, self.config_hash()) or not all(os.path.exists(output) for output in self.outputs):
+            return False
+        input_times = [os.path.getmtime(path) for path in self.inputs if os.path.exists(path)]
+        return not input_times or min(os.path.getmtime(output) for output in self.outputs) >= max(input_times)
+
+    def execute(self, profile_path=None):
+        start = time.time()
+        with profiled(profile_path):
+            self.run()
+        # folders (like a clone target) only change mtime when their entries do, so every output is marked as new
+        for output in self.outputs:
+            if os.path.exists(output):
+                os.utime(output)
+        seconds = time.time() - start
+        METRICS.add_time("stage", seconds, self.name)
+        return seconds
+
+
+class Pipeline:
+    '''Stages by name, run in dependency order with independent stages at once.'''
+
+    def __init__(self, stages, state_path=PIPELINE_STATE_PATH) -> None:
+        self.stages = {stage.name: stage for stage in stages}
+        self.state_path = state_path
+
+    def resolve(self, targets):
+        # "clone" stands for every "clone:<technology>"
+        names = []
+        for target in targets:
+            matches = [name for name in self.stages if name == target or name.split(":")[0] == target]
+            if not matches:
+                raise ValueError(f"Unknown stage {target}, expected one of {sorted(self.stages)}")
+            names += matches
+        return names
+
+    def plan(self, targets):
+        '''The targets and everything they depend on, dependencies first.'''
+        order = []
+        visiting = set()
+
+        def visit(name):
+            if name in order:
+                return
+            if name in visiting:
+                raise ValueError(f"Dependency cycle through {name}")
+            visiting.add(name)
+            for dependency in self.stages[name].depends:
+                visit(dependency)
+            visiting.discard(name)
+            order.append(name)
+
+        for name in self.resolve(targets):
+            visit(name)
+        return order
+
+    def load_state(self):
+        if not os.path.exists(self.state_path):
+            return {}
+        with open(self.state_path, "r") as state_file:
+            return json.load(state_file)
+
+    def save_state(self, state):
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        with open(self.state_path, "w+") as state_file:
+            json.dump(state, state_file, indent=4, sort_keys=True)
+
+    def stale(self, order, forced=(), state=None):
+        # a stage runs when forced, out of date, or after a stage it depends on
+        state = self.load_state() if state is None else state
+        stale = {}
+        for name in order:
+            stage = self.stages[name]
+            stale[name] = (name in forced or not stage.is_fresh(state.get(name))
+                           or any(stale[dependency] for dependency in stage.depends))
+        return stale
+
+    def run(self, targets, force=False, max_workers=len(TECHNOLOGIES), dry_run=False, profile_path=None):
+        '''Runs what the targets need and returns the names of the stages that failed. With a profile_path every
+        stage that runs dumps a cProfile of its thread there, as <stage>.prof, and the stages run one at a time: only
+        one profiler can be active at once (Python 3.12 raises for a second one).'''
+        if profile_path and max_workers > 1:
+            print("Profiling, the stages run one at a time")
+            max_workers = 1
+        order = self.plan(targets)
+        state = self.load_state()
+        stale = self.stale(order, self.resolve(targets) if force else (), state)
+        for name in order:
+            print(f"{name}: {'run' if stale[name] else 'up to date'}")
+        if dry_run:
+            return []
+        pending = [name for name in order if stale[name]]
+        done = set()
+        failed = []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            running = {}
+            while pending or running:
+                for name in list(pending):
+                    depends = [dependency for dependency in self.stages[name].depends if stale[dependency]]
+                    if any(dependency in failed for dependency in depends):
+                        pending.remove(name)
+                        failed.append(name)
+                        print(f"{name}: not run, a stage it depends on failed")
+                    elif all(dependency in done for dependency in depends):
+                        pending.remove(name)
+                        stage_profile = f"{profile_path}/{name.replace(':', '_')}.prof" if profile_path else None
+                        running[executor.submit(self.stages[name].execute, stage_profile)] = name
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    try:
+                        print(f"{name}: done in {future.result():.1f}s")
+                    except Exception as e:
+                        failed.append(name)
+                        print(f"{name}: failed, {e!r}")
+                        continue
+                    done.add(name)
+                    state[name] = self.stages[name].config_hash()
+                    self.save_state(state)
+        return failed
+
+
+def build_stages(args):
+    '''search -> clone:<technology> -> index:<technology> -> count -> stats, and clone:<technology> -> history'''
+    stages = [Stage("search", lambda: search_technologies(TECHNOLOGIES, split_dates=not args.no_split_dates),
+                    outputs=[f"CSVs/{technology}.csv" for technology in TECHNOLOGIES],
+                    config={"technologies": TECHNOLOGIES, "split_dates": not args.no_split_dates})]
+    for technology in TECHNOLOGIES:
+        stages.append(Stage(f"clone:{technology}",
+                            lambda technology=technology: clone_repos(n_jobs=args.clone_jobs, mode=args.clone_mode,
+                                                                      bare=args.bare, technologies=[technology]),
+                            inputs=[f"CSVs/{technology}.csv", GRAY_LIST_PATH],
+                            outputs=[f"repos/{technology}"],
+                            depends=["search"],
+                            config={"mode": args.clone_mode, "bare": args.bare}))
+        source_folder = SOURCE_FOLDERS.get(technology)
+        stages.append(Stage(f"index:{technology}",
+                            lambda technology=technology: METRICS.merge(create_file_list(technology)),
+                            inputs=[f"repos/{technology}"],
+                            outputs=[f"indexes/{technology}.txt"],
+                            depends=[f"clone:{technology}"],
+                            config={"extensions": FILE_EXTENSIONS[technology],
+                                    "source_folder": source_folder.pattern if source_folder else None,
+                                    "pruned_folders": sorted(PRUNED_FOLDERS)}))
+    # the blob indexes are only made, and read, by a dedup or duplicate exclusion of the files of the working trees
+    dedup = (args.dedup or args.exclude_duplicates is not None) and args.count_mode != "git"
+    if dedup:
+        for technology in TECHNOLOGIES:
+            stages.append(Stage(f"dedup:{technology}",
+                                lambda technology=technology: create_blob_index(technology, n_jobs=args.jobs),
+                                inputs=[f"indexes/{technology}.txt"],
+                                outputs=[BLOB_INDEX_PATH.format(technology=technology)],
+                                depends=[f"index:{technology}"]))
+    stages.append(Stage("count", lambda: count(args),
+                        inputs=[f"indexes/{technology}.txt" for technology in TECHNOLOGIES] + [REPO_LIST_PATH,
+                                                                                               OPERANDS_PATH],
+                        outputs=[USAGE_PATH, USAGE_CSV, f"{USAGE_STORE_PATH}/{INDEX_FILE}"],
+                        depends=[f"{'dedup' if dedup else 'index'}:{technology}" for technology in TECHNOLOGIES],
+                        config={"mode": args.count_mode, "rev": args.rev if args.count_mode == "git" else None,
+                                "tokenize": args.tokenize, "rxjs_pipe": args.rxjs_pipe,
+                                "ingest_policy": args.ingest_policy, "max_file_size": args.max_file_size,
+                                "dedup": args.dedup, "exclude_duplicates": args.exclude_duplicates}))
+    stages.append(Stage("stats", process_usage,
+                        inputs=[USAGE_PATH, f"{USAGE_STORE_PATH}/{INDEX_FILE}"],
+                        outputs=[STATS_PATH, STATS_CSV, UNUSED_PATH, UNUSED_CSV],
+                        depends=["count"]))
+    stages.append(Stage("history", lambda: history(args),
+                        inputs=[f"repos/{technology}" for technology in TECHNOLOGIES] + [REPO_LIST_PATH, OPERANDS_PATH],
+                        outputs=[USAGE_HISTORY_CSV],
+                        depends=[f"clone:{technology}" for technology in TECHNOLOGIES],
+                        config={"rev": args.rev, "samples": args.samples, "sample_by": args.sample_by,
+                                "tokenize": args.tokenize, "rxjs_pipe": args.rxjs_pipe,
+                                "ingest_policy": args.ingest_policy, "max_file_size": args.max_file_size}))
+    return stages
+
+
+def count(args):
+    reader = FileReader(args.ingest_policy, args.max_file_size * 1024 * 1024)
+    if args.count_mode == "git":
+        count_usage_git_all(rev=args.rev, n_jobs=args.jobs, tokenize=args.tokenize, pipe_scoped=args.rxjs_pipe,
+                            reader=reader)
+    elif args.count_mode == "unthreaded":
+        count_usage_unthreaded(use_cache=not args.no_cache, tokenize=args.tokenize, pipe_scoped=args.rxjs_pipe,
+                               reader=reader, dedup=args.dedup, duplicate_threshold=args.exclude_duplicates)
+    else:
+        count_usage_threaded(n_jobs=args.jobs, use_cache=not args.no_cache, tokenize=args.tokenize,
+                             pipe_scoped=args.rxjs_pipe, reader=reader, dedup=args.dedup,
+                             duplicate_threshold=args.exclude_duplicates)
+
+
+def history(args):
+    count_usage_history(rev=args.rev, samples=args.samples, by=args.sample_by, n_jobs=args.jobs,
+                        tokenize=args.tokenize, pipe_scoped=args.rxjs_pipe,
+                        reader=FileReader(args.ingest_policy, args.max_file_size * 1024 * 1024))
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="search -> clone -> index -> count -> stats, and clone -> history, "
+                                                 "redoing only what is out of date")
+    parser.add_argument("targets", nargs="*", default=["stats"],
+                        help="stages to bring up to date with what they depend on, e.g. count or index:rxjs")
+    parser.add_argument("--force", action="store_true", help="run the targets even if they are up to date")
+    parser.add_argument("--dry-run", action="store_true", help="only print what would run")
+    parser.add_argument("--stage-jobs", type=int, default=len(TECHNOLOGIES), help="stages run at once")
+    parser.add_argument("--jobs", type=int, default=-1, help="count workers, all cores by default")
+    parser.add_argument("--no-split-dates", action="store_true",
+                        help="do not split the star values with over 1000 results by creation date")
+    parser.add_argument("--clone-jobs", type=int, default=CLONE_WORKERS, help="clones at once per technology")
+    parser.add_argument("--clone-mode", choices=sorted(CLONE_MODES), default="full")
+    parser.add_argument("--bare", action="store_true", help="clone without a working tree, for --count-mode git")
+    parser.add_argument("--count-mode", choices=COUNT_MODES, default="threaded")
+    parser.add_argument("--rev", default="HEAD", help="revision counted by --count-mode git and history")
+    parser.add_argument("--samples", type=int, default=12, help="commits of every clone counted by history")
+    parser.add_argument("--sample-by", choices=SAMPLE_BY, default="count", help="how history picks the commits")
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--tokenize", action="store_true", help="skip comments and string literals")
+    parser.add_argument("--rxjs-pipe", action="store_true", help="count only the rxjs operators given to pipe()")
+    parser.add_argument("--ingest-policy", choices=POLICIES, default="scan",
+                        help="for minified, generated and oversized files")
+    parser.add_argument("--max-file-size", type=int, default=MAX_FILE_SIZE // 1024 // 1024, help="in MB")
+    parser.add_argument("--dedup", action="store_true", help="scan the files with the same content once")
+    parser.add_argument("--exclude-duplicates", type=float, metavar="RATIO",
+                        help="leave out of the counts the repos sharing this share of their files with a larger one")
+    parser.add_argument("--profile", metavar="FOLDER", help="cProfile dump of every stage that runs")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_arguments(argv)
+    osSleep = None
+    # in Windows, prevent the OS from sleeping while running
+    if os.name == 'nt':
+        osSleep = WindowsInhibitor()
+        osSleep.inhibit()
+    print(datetime.now())
+    try:
+        failed = Pipeline(build_stages(args)).run(args.targets, force=args.force, max_workers=args.stage_jobs,
+                                                  dry_run=args.dry_run, profile_path=args.profile)
+    except ValueError as e:
+        raise SystemExit(e)
+    if not args.dry_run:
+        save_run_report(targets=args.targets, failed=failed)
+    print(datetime.now())
+    if osSleep:
+        osSleep.allow()
+    if failed:
+        raise SystemExit(f"Failed: {failed}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,25 @@
+import functools
 import json
 import os
 import re
-import sys
-import time
-import statistics
-from collections import Counter
-from datetime import datetime
+import shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from joblib import Parallel, delayed
 
 import git
 import pandas
 from git import GitCommandError
 
-from windows_inhibitor import WindowsInhibitor
+from blob_scanner import repo_size, scan_history, scan_repo_blobs
+from clone_journal import CloneJournal
+from content_dedup import duplicate_repos, duplicate_results, fan_out, load_blob_index, unique_blobs
+from file_ingest import FileReader
+from instrumentation import METRICS, Metrics, timed
+from usage_cache import UsageCache, partial_usage_of, scan_changed_files
+from usage_scanner import (build_matchers, matcher_of, merge_usage, project_of, scan_file_counts, scan_files,
+                           schedule_shards)
+from usage_store import load_usage_store, save_usage_store, store_is_current
+from usage_table import UsageTable
 
 TECHNOLOGIES = ["rxjava", "rxjs", "rxswift", "rxkotlin"]
 FILE_EXTENSIONS = {"rxjava": ["java"],
@@ -20,101 +27,164 @@ FILE_EXTENSIONS = {"rxjava": ["java"],
                    "rxkotlin": ["kt", "java"],
                    "rxswift": ["swift"],
                    "rxdart": ["dart"]}
+# only files under these folders count for java/kotlin, where tests and samples are excluded
+SOURCE_FOLDERS = {"rxjava": re.compile("src.main.java"),
+                  "rxkotlin": re.compile("src.main.kotlin")}
+# vendored dependencies and build outputs, never indexed
+PRUNED_FOLDERS = {"node_modules", "build", "Pods", ".git"}
+# names of the technologies in the CSV outputs
+DISTRIBUTIONS = {"rxjava": "RxJava",
+                 "rxjs": "RxJS",
+                 "rxkotlin": "RxKotlin",
+                 "rxswift": "RxSwift",
+                 "rxdart": "RxDart"}
 RX_GH_USERS = ["ReactiveX", "dotnet", "neuecc", "bjornbytes", "alfert", "Reactive-Extensions"]
 
 
+GITHUB_URL = "https://github.com/{full_name}.git"
+# only the working tree is scanned, so the history can be left behind
+CLONE_MODES = {"full": [],
+               "shallow": ["--depth=1"],
+               "blobless": ["--filter=blob:none"]}
+CLONE_WORKERS = 8
+CLONE_JOURNAL = "clone_journal.jsonl"
+
 GRAY_LIST_PATH = "gray_list.json"
 REPO_LIST_PATH = "repo_list.json"
 
 OPERANDS_PATH = "indexes/operands.json"
 USAGE_PATH = "indexes/operands_usage.json"
 USAGE_CSV = "indexes/operands_usage.csv"
+USAGE_STORE_PATH = "indexes/usage"
+USAGE_HISTORY_CSV = "indexes/operands_usage_history.csv"
 STATS_PATH = "indexes/operands_stats.json"
 STATS_CSV = "indexes/operands_stats.csv"
 UNUSED_PATH = "indexes/usage_stats.json"
 UNUSED_CSV = "indexes/usage_stats.csv"
-
-
-def clone_repos():
-    for technology in TECHNOLOGIES:
-        repos_df = pandas.read_csv(f'CSVs/{technology}.csv')
-        counter = 60
-        with open(GRAY_LIST_PATH, "r") as gray_list_file:
-            gray_list = json.load(gray_list_file)
-            blacklist = gray_list["blacklist"]
-            for index, row in repos_df.iterrows():
-                if counter == 0 or row["stargazers_count"] < 15:
-                    break
-                if row[u"owner"] in RX_GH_USERS or f'{row["owner"]}_{row["name"]}' in blacklist:
+USAGE_CACHE_PATH = "indexes/usage_cache.sqlite"
+FLAGGED_FILES_PATH = "indexes/flagged_files.json"
+DUPLICATE_REPOS_PATH = "indexes/duplicate_repos.json"
+
+# files per task handed to a worker by count_usage_threaded
+SHARD_SIZE = 250
+
+
+def select_repos(technology):
+    repos_df = pandas.read_csv(f'CSVs/{technology}.csv')
+    counter = 60
+    selected = []
+    with open(GRAY_LIST_PATH, "r") as gray_list_file:
+        gray_list = json.load(gray_list_file)
+        blacklist = gray_list["blacklist"]
+        for index, row in repos_df.iterrows():
+            if counter == 0 or row["stargazers_count"] < 15:
+                break
+            if row[u"owner"] in RX_GH_USERS or f'{row["owner"]}_{row["name"]}' in blacklist:
+                continue
+            selected.append((row["full_name"], f'{row["owner"]}_{row["name"]}'))
+            counter -= 1
+    return selected
+
+
+def clone_repo(url, path, mode="full", bare=False):
+    options = CLONE_MODES[mode] + (["--bare"] if bare else [])
+    with METRICS.timer("clone", path):
+        git.Repo.clone_from(url, path, multi_options=options)
+
+
+def clone_repos(n_jobs=CLONE_WORKERS, mode="full", bare=False, remote_url=GITHUB_URL, repos_path="repos",
+                technologies=TECHNOLOGIES):
+    journal = CloneJournal(f"{repos_path}/{CLONE_JOURNAL}")
+    to_clone = []
+    for technology in technologies:
+        for full_name, project in select_repos(technology):
+            repo = f"{technology}/{project}"
+            path = f"{repos_path}/{repo}"
+            state = journal.state(repo)
+            # a done repository that was removed since is cloned again
+            if os.path.exists(path):
+                if state == CloneJournal.DONE:
                     continue
-                try:
-                    git.Repo.clone_from(f'https://github.com/{row["full_name"]}.git',
-                                        f'repos/{technology}/{row["owner"]}_{row["name"]}')
-                except GitCommandError as e:
-                    pass
-                    # print(e)
-                counter -= 1
-
-
-def get_files(path, extension, file_writer):
-    for subdir, folders, files in os.walk(path):
-
-        for folder in folders:
-            folder_path = f'{path}/{folder}'
-            get_files(folder_path, extension, file_writer)
-
-        for file in files:
-
-            file_path = f'{subdir}/{file}'
-            if "rxjava" in subdir:
-                if file.endswith(f'.{extension}') and re.search("src.main.java", subdir):
-                    file_writer.write(file_path + "\n")
-
-            elif "rxkotlin" in subdir:
-                if file.endswith(f'.{extension}') and re.search("src.main.kotlin", subdir):
-                    file_writer.write(file_path + "\n")
-
-            elif "rxswift" in subdir or "rxdart" in subdir or "rxjs" in subdir:
-                if file.endswith(f'.{extension}') and extension in ["js", "cs", "ts", "swift", "dart"]:
-                    try:
-                        file_writer.write(file_path + "\n")
-                    except UnicodeEncodeError:
-                        print(file_path)
-                        print(UnicodeEncodeError)
-
-        #     if removable:
-        #         try:
-        #             removal_path = f"{os.getcwd()}/{file_path}"
-        #             os.remove(os.path.abspath(removal_path))
-        #         except (FileNotFoundError, PermissionError) as e:
-        #             # print(e)
-        #             pass
-        #
-        # try:
-        #     os.rmdir(path)
-        # except (FileNotFoundError, OSError) as e:
-        #     # print(e)
-        #     pass
+                if state is None:
+                    journal.record(repo, CloneJournal.DONE, "already present")
+                    continue
+                # left over of an interrupted or failed clone
+                shutil.rmtree(path, ignore_errors=True)
+            journal.record(repo, CloneJournal.PENDING)
+            to_clone.append((repo, remote_url.format(full_name=full_name), path))
+
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        futures = {executor.submit(clone_repo, url, path, mode, bare): repo for repo, url, path in to_clone}
+        for future in as_completed(futures):
+            try:
+                future.result()
+                journal.record(futures[future], CloneJournal.DONE)
+            except GitCommandError as e:
+                journal.record(futures[future], CloneJournal.FAILED, str(e.stderr).strip())
+    journal.close()
+    failed = [repo for repo, _, _ in to_clone if journal.state(repo) == CloneJournal.FAILED]
+    METRICS.count("cloned", len(to_clone) - len(failed))
+    METRICS.count("clones_failed", len(failed))
+    print(f"Cloned {len(to_clone) - len(failed)} of {len(to_clone)} repositories, failed: {failed}")
+
+
+def get_files(technology, repos_path="repos"):
+    # walks repos/<technology> once, yielding the source files of every extension as "<technology>/<project>/..."
+    extensions = tuple(f".{extension}" for extension in FILE_EXTENSIONS[technology])
+    source_folder = SOURCE_FOLDERS.get(technology)
+    pending = [technology]
+    while pending:
+        subdir = pending.pop()
+        try:
+            entries = list(os.scandir(f"{repos_path}/{subdir}"))
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            continue
+        is_source_folder = source_folder is None or source_folder.search(subdir)
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name not in PRUNED_FOLDERS:
+                    pending.append(f"{subdir}/{entry.name}")
+            elif is_source_folder and entry.name.endswith(extensions):
+                yield f"{subdir}/{entry.name}"
+
+
+def is_source_file(technology, file_path):
+    # the rules of get_files, for a single "<technology>/<project>/..." path
+    subdir, _, file = file_path.rpartition("/")
+    source_folder = SOURCE_FOLDERS.get(technology)
+    return (file.endswith(tuple(f".{extension}" for extension in FILE_EXTENSIONS[technology]))
+            and PRUNED_FOLDERS.isdisjoint(subdir.split("/")[1:])
+            and (source_folder is None or source_folder.search(subdir) is not None))
 
 
 def create_file_list_threaded():
-    Parallel(n_jobs=len(TECHNOLOGIES))(delayed(create_file_list)(technology) for technology in TECHNOLOGIES)
+    for metrics in Parallel(n_jobs=len(TECHNOLOGIES))(delayed(create_file_list)(technology)
+                                                      for technology in TECHNOLOGIES):
+        METRICS.merge(metrics)
 
 
 def create_file_list_unthreaded():
     for technology in TECHNOLOGIES:
-        create_file_list(technology)
+        METRICS.merge(create_file_list(technology))
 
 
 def create_file_list(technology):
-    # for technology in TECHNOLOGIES:
-    for extension in FILE_EXTENSIONS[technology]:
-        with open(f"indexes/{technology}.txt", "a+") as f:
-            os.chdir("repos/")
-            get_files(f"{technology}", extension, f)
-            os.chdir("..")
+    # returns the metrics of the walk, as it can run in a worker process
+    metrics = Metrics()
+    with metrics.timer("index", technology):
+        file_paths = sorted(set(get_files(technology)))
+        with open(f"indexes/{technology}.txt", "w", encoding="utf-8") as f:
+            for file_path in file_paths:
+                try:
+                    f.write(file_path + "\n")
+                except UnicodeEncodeError:
+                    print(file_path)
+                    print(UnicodeEncodeError)
+    metrics.count("indexed_files", len(file_paths))
+    return metrics
 
 
+@timed("count_word")
 def count_word(word, path_file, technology):
     try:
         with open(path_file, encoding="utf-8", errors="ignore") as f:
@@ -124,123 +194,288 @@ def count_word(word, path_file, technology):
         return 0
 
 
-def count_usage_unthreaded():
+@timed("count_usage_unthreaded")
+def count_usage_unthreaded(use_cache=True, tokenize=False, pipe_scoped=False, reader=None, dedup=False,
+                           duplicate_threshold=None):
+    cache = UsageCache(USAGE_CACHE_PATH) if use_cache else None
+    reader = FileReader() if reader is None else reader
     with open(OPERANDS_PATH, "r") as operands_file:
         operands = json.load(operands_file)
+        blob_indexes = load_blob_indexes(dedup or duplicate_threshold is not None)
+        repo_list = exclude_duplicate_repos(load_repo_list(), blob_indexes, duplicate_threshold)
         for technology in TECHNOLOGIES:
-            operands = count_usage(operands, technology)
-        with open(USAGE_PATH, "w+") as usage_json:
-            json.dump(operands, usage_json, indent=4, sort_keys=True)
-        usage_json_to_csv()
-
-
-def count_usage_threaded():
+            operands = count_usage(operands, technology, cache=cache, tokenize=tokenize, pipe_scoped=pipe_scoped,
+                                   reader=reader, repo_list=repo_list,
+                                   blob_index=blob_indexes[technology] if dedup else None)
+        save_usage(operands)
+    if cache:
+        cache.close()
+    save_ingest_report(reader)
+
+
+@timed("count_usage_threaded")
+def count_usage_threaded(n_jobs=-1, shard_size=SHARD_SIZE, use_cache=True, tokenize=False, pipe_scoped=False,
+                         reader=None, dedup=False, duplicate_threshold=None):
+    cache = UsageCache(USAGE_CACHE_PATH) if use_cache else None
+    reader = FileReader() if reader is None else reader
     with open(OPERANDS_PATH, "r") as operands_file:
         operands = json.load(operands_file)
-        Parallel(n_jobs=len(TECHNOLOGIES-1))(delayed(count_usage)
-                                           (operands, technology) for technology in TECHNOLOGIES)
-        with open(USAGE_PATH+"t", "w+") as usage_json:
-            json.dump(operands, usage_json, indent=4, sort_keys=True)
+        matchers = build_matchers(operands, TECHNOLOGIES, tokenize, pipe_scoped)
+        fingerprints = {technology: reader.fingerprint(matcher) for technology, matcher in matchers.items()}
+        blob_indexes = load_blob_indexes(dedup or duplicate_threshold is not None)
+        repo_list = exclude_duplicate_repos(load_repo_list(), blob_indexes, duplicate_threshold)
+        file_counts = {}
+        technology_files = {}
+        groups = {}
+        for technology in TECHNOLOGIES:
+            file_counts[technology], technology_files[technology], groups[technology] = \
+                files_to_scan(technology, get_usage_files(technology, repo_list), cache, fingerprints[technology],
+                              reader, blob_indexes[technology] if dedup else None)
+        # one queue for all the technologies, largest shards first, each shard with the matcher of its technology.
+        # batch_size=1 keeps joblib from regrouping the shards, so the workers take them in that order
+        tasks = schedule_shards(technology_files, shard_size, path_of=(lambda miss: miss[0]) if cache else None)
+        # the workers reduce their shard to per project counts, unless the cache or dedup need per file counts
+        parallel = Parallel(n_jobs=n_jobs, batch_size=1)
+        if cache:
+            results = parallel(delayed(scan_changed_files)(matchers[technology], file_shard, reader=reader.empty_copy())
+                               for technology, file_shard in tasks)
+        elif dedup:
+            results = parallel(delayed(scan_file_counts)(matchers[technology], file_shard, reader=reader.empty_copy())
+                               for technology, file_shard in tasks)
+        else:
+            results = parallel(delayed(scan_files)(technology, matchers[technology], file_shard,
+                                                   reader=reader.empty_copy())
+                               for technology, file_shard in tasks)
+        scanned = {technology: [] for technology in TECHNOLOGIES}
+        for (technology, _), (result, shard_reader) in zip(tasks, results):
+            reader.merge(shard_reader)
+            if cache or dedup:
+                scanned[technology] += result
+            else:
+                operands = merge_usage(operands, technology, result)
+        if cache or dedup:
+            for technology in TECHNOLOGIES:
+                file_counts[technology].update(collect_counts(technology, scanned[technology], cache,
+                                                              fingerprints[technology], groups[technology],
+                                                              blob_indexes[technology], reader))
+                operands = merge_usage(operands, technology, partial_usage_of(technology, file_counts[technology]))
+        save_usage(operands)
+    if cache:
+        cache.close()
+    save_ingest_report(reader)
+
+
+@timed("count_usage_git_all")
+def count_usage_git_all(rev="HEAD", n_jobs=1, tokenize=False, pipe_scoped=False, reader=None):
+    reader = FileReader() if reader is None else reader
+    with open(OPERANDS_PATH, "r") as operands_file:
+        operands = json.load(operands_file)
+        operands = count_usage_git(operands, TECHNOLOGIES, rev=rev, n_jobs=n_jobs, tokenize=tokenize,
+                                   pipe_scoped=pipe_scoped, reader=reader)
+        save_usage(operands)
+    save_ingest_report(reader)
+
+
+def count_usage_git(operands, technologies, rev="HEAD", n_jobs=1, repos_path="repos", tokenize=False,
+                    pipe_scoped=False, reader=None):
+    # same counts as count_usage, but over the blobs of rev in every clone, without needing a checkout. The clones of
+    # all the technologies are one queue, largest first
+    technologies = [technologies] if isinstance(technologies, str) else technologies
+    reader = FileReader() if reader is None else reader
+    matchers = build_matchers(operands, technologies, tokenize, pipe_scoped)
+    repo_list = load_repo_list()
+    tasks = [(technology, project) for technology in technologies
+             for project in sorted(os.listdir(f"{repos_path}/{technology}")) if project in repo_list[technology]]
+    tasks.sort(key=lambda task: -repo_size(f"{repos_path}/{task[0]}/{task[1]}"))
+    results = Parallel(n_jobs=n_jobs, batch_size=1)(delayed(scan_repo_blobs)
+                                                    (matchers[technology], f"{repos_path}/{technology}/{project}", rev,
+                                                     functools.partial(is_source_file, technology),
+                                                     f"{technology}/{project}/", PRUNED_FOLDERS,
+                                                     reader=reader.empty_copy()) for technology, project in tasks)
+    partial_usages = {technology: {} for technology in technologies}
+    for (technology, project), (counts, total_blobs, project_reader) in zip(tasks, results):
+        reader.merge(project_reader)
+        if total_blobs:
+            partial_usages[technology][project] = counts
+    for technology in technologies:
+        operands = merge_usage(operands, technology, partial_usages[technology])
+    return operands
 
 
-def count_usage(operands, technology):
-    print(technology)
-    technology_length = len(technology)
+@timed("count_usage_history")
+def count_usage_history(rev="HEAD", samples=12, by="count", n_jobs=1, repos_path="repos", tokenize=False,
+                        pipe_scoped=False, reader=None):
+    reader = FileReader() if reader is None else reader
+    with open(OPERANDS_PATH, "r") as operands_file, open(REPO_LIST_PATH, "r") as repo_list_file, \
+            open(USAGE_HISTORY_CSV, "w+") as csv_file:
+        operands = json.load(operands_file)
+        repo_list = json.load(repo_list_file)
+        csv_file.write('"distribution","repo","commit","date","operand","usage"')
+        for technology in TECHNOLOGIES:
+            print(technology)
+            matcher = matcher_of(technology, operands[technology].keys(), tokenize, pipe_scoped)
+            projects = [project for project in sorted(os.listdir(f"{repos_path}/{technology}"))
+                        if project in repo_list[technology]]
+            histories = Parallel(n_jobs=n_jobs)(delayed(scan_history)
+                                                (matcher, f"{repos_path}/{technology}/{project}", rev, samples, by,
+                                                 functools.partial(is_source_file, technology),
+                                                 f"{technology}/{project}/", PRUNED_FOLDERS,
+                                                 reader=reader.empty_copy()) for project in projects)
+            for project, (history, project_reader) in zip(projects, histories):
+                reader.merge(project_reader)
+                for commit, date, counts, total_files in history:
+                    if not total_files:
+                        continue
+                    for operand in matcher.operands:
+                        csv_file.write(f'\n{DISTRIBUTIONS[technology]},{project},{commit},{date.isoformat()},'
+                                       f'{operand},{counts[operand]}')
+    save_ingest_report(reader)
+
+
+@timed("save_usage")
+def save_usage(operands):
+    # the binary store is what the statistics load, the JSON and CSV are exports
+    with open(USAGE_PATH, "w+") as usage_json:
+        json.dump(operands, usage_json, indent=4, sort_keys=True)
+    save_usage_store(operands, USAGE_STORE_PATH)
+    usage_json_to_csv(UsageTable.from_usage(operands, TECHNOLOGIES))
+
+
+def save_ingest_report(reader):
+    # bytes scanned and skipped, and with a policy the files it flagged as {file: kind}
+    reader.report()
+    METRICS.merge(reader.metrics)
+    METRICS.counters.update(reader.stats)
+    if reader.policy != "scan":
+        with open(FLAGGED_FILES_PATH, "w+") as flagged_json:
+            json.dump(reader.flagged, flagged_json, indent=4, sort_keys=True)
+
+
+def load_repo_list():
+    with open(REPO_LIST_PATH, "r") as repo_list_file:
+        return json.load(repo_list_file)
+
+
+def get_usage_files(technology, repo_list=None):
     file_list_path = f"indexes/{technology}.txt"
-    with open(file_list_path, "r") as file_list_file, open(REPO_LIST_PATH, "r") as repo_list_file:
-        whitelist = json.load(repo_list_file)[technology]
+    whitelist = set((repo_list or load_repo_list())[technology])
+    with open(file_list_path, "r", encoding="utf-8") as file_list_file:
         file_list = set([x for x in file_list_file.read().split("\n") if x])
-        for file in file_list:
-            project = file[technology_length+1: file[technology_length+1:].find("/") + technology_length+1]
-            if project not in whitelist:
-                continue
-            # if technology == "rxjs":
-            #     operands = count_usage_rxjs(path_file=f"repos/{file}", operands=operands, project=project)
+        return sorted(file for file in file_list if project_of(file, technology) in whitelist)
 
-            technology_operands = operands[technology].keys()
-            for operand in technology_operands:
-                path_file = f"repos/{file}"
-                word_count = count_word(word=operand, path_file=path_file, technology=technology)
-                try:
-                    if operands[technology][operand][project] > 0:
-                        operands[technology][operand][project] = operands[technology][operand][project] + word_count
-                    else:
-                        operands[technology][operand][project] = word_count
-                except KeyError as e:
-                    operands[technology][operand][project] = word_count
-    return operands
 
-
-def calculate_stats():
-    result = {}
+@timed("count_usage")
+def count_usage(operands, technology, cache=None, tokenize=False, pipe_scoped=False, reader=None, repo_list=None,
+                blob_index=None):
+    print(technology)
+    # with pipe_scoped, rxjs counts only the operators given to pipe(...), like count_usage_rxjs, in linear time
+    matcher = matcher_of(technology, operands[technology].keys(), tokenize, pipe_scoped)
+    reader = FileReader() if reader is None else reader
+    fingerprint = reader.fingerprint(matcher)
+    file_counts, files, groups = files_to_scan(technology, get_usage_files(technology, repo_list), cache,
+                                               fingerprint, reader, blob_index)
+    if cache:
+        results, _ = scan_changed_files(matcher, files, reader=reader)
+    elif blob_index is not None:
+        results, _ = scan_file_counts(matcher, files, reader=reader)
+    else:
+        partial_usage, _ = scan_files(technology, matcher, files, reader=reader)
+        return merge_usage(operands, technology, partial_usage)
+    file_counts.update(collect_counts(technology, results, cache, fingerprint, groups, blob_index, reader))
+    return merge_usage(operands, technology, partial_usage_of(technology, file_counts))
+
+
+def files_to_scan(technology, files, cache, fingerprint, reader, blob_index=None):
+    '''({file: Counter} from the cache, files or cache misses to scan, {representative: [files]} or None). With a
+    blob index only one file of those with the same content is scanned.'''
+    cached_counts = {}
+    if cache:
+        cache.prune(technology, files)
+        cached_counts, files = cache.lookup(technology, fingerprint, files)
+        reader.stats["cached_files"] += len(cached_counts)
+    if blob_index is None:
+        return cached_counts, files, None
+    groups = unique_blobs([miss[0] for miss in files] if cache else files, blob_index)
+    reader.stats["duplicate_files"] += sum(len(group) - 1 for group in groups.values())
+    if cache:
+        stored_hashes = dict(files)
+        return cached_counts, [(file, stored_hashes[file]) for file in groups], groups
+    return cached_counts, list(groups), groups
+
+
+def collect_counts(technology, results, cache, fingerprint, groups, blob_index, reader):
+    # {file: Counter} of the results of the scan of files_to_scan, given to the files left out as duplicates
+    if cache:
+        file_counts = cache.update(technology, fingerprint, results)
+        if groups:
+            kinds = {file: kind for file, _, _, _, _, kind in results}
+            file_counts.update(cache.update(technology, fingerprint,
+                                            duplicate_results(groups, file_counts, kinds, blob_index)))
+        reader.flagged.update(cache.kinds(technology))
+        return file_counts
+    file_counts = dict(results)
+    if groups:
+        reader.flagged.update({file: reader.flagged[representative] for representative, files in groups.items()
+                               for file in files if representative in reader.flagged})
+        file_counts = fan_out(groups, file_counts)
+    return file_counts
+
+
+def load_blob_indexes(needed=True):
+    # {technology: blob index}, empty ones when not needed
+    return {technology: load_blob_index(technology) if needed else {} for technology in TECHNOLOGIES}
+
+
+def exclude_duplicate_repos(repo_list, blob_indexes, threshold=None):
+    '''repo_list without the repos sharing at least threshold of their distinct files with a larger one, listed in
+    DUPLICATE_REPOS_PATH as {technology: {repo: repo it duplicates}}. Unchanged without a threshold.'''
+    if threshold is None:
+        return repo_list
+    duplicates = {technology: duplicate_repos(technology, blob_indexes[technology], threshold,
+                                              repo_list[technology]) for technology in TECHNOLOGIES}
+    with open(DUPLICATE_REPOS_PATH, "w+") as duplicates_json:
+        json.dump(duplicates, duplicates_json, indent=4, sort_keys=True)
+    return {technology: [project for project in projects if project not in duplicates.get(technology, {})]
+            for technology, projects in repo_list.items()}
+
+
+@timed("load_usage")
+def load_usage():
+    if store_is_current(USAGE_STORE_PATH, USAGE_PATH):
+        return UsageTable.from_store(load_usage_store(USAGE_STORE_PATH), TECHNOLOGIES)
     with open(USAGE_PATH, "r") as operands_usage_file:
-        operands_usage_full = json.load(operands_usage_file)
-        for technology in TECHNOLOGIES:
-            if technology == "rxjs":
-                technology_csv = "RxJS"
-            if technology == "rxjava":
-                technology_csv = "RxJava"
-            if technology == "rxswift":
-                technology_csv = "RxSwift"
-            if technology == "rxkotlin":
-                technology_csv = "RxKotlin"
-            if technology == "rxdart":
-                technology_csv = "RxDart"
-            result[technology_csv] = {}
-            operands_usage = operands_usage_full[technology]
-            operands = list(operands_usage.keys())
-            for operand in operands:
-                values = list(operands_usage[operand].values())
-                result[technology_csv][operand] = {}
-                if values:
-                    total = sum(values)
-                    presence = len([i for i in values if i > 0])
-                    result[technology_csv][operand]["total_uses"] = total
-                    result[technology_csv][operand]["repos_present"] = presence
-                    result[technology_csv][operand]["median"] = statistics.median(values)
-                    result[technology_csv][operand]["average_all"] = total/len(values)
-                    result[technology_csv][operand]["average_present"] = total/presence if presence > 0 else 0
-                    result[technology_csv][operand]["coverage"] = presence/len(values)
-                    try:
-                        result[technology_csv][operand]["mode"] = statistics.mode(values)
-                    except statistics.StatisticsError:
-                        count_dict = Counter(values)
-                        count_values = list(count_dict.values())
-                        most_common = [str(i[0]) for i in sorted(
-                            count_dict.most_common(count_values.count(max(count_values))))]
-                        result[technology_csv][operand]["mode"] = f'"{"|".join(most_common)}"'
-                else:
-                    result[technology_csv][operand]["total_uses"] = 0
-                    result[technology_csv][operand]["repos_present"] = 0
-                    result[technology_csv][operand]["median"] = 0
-                    result[technology_csv][operand]["average_all"] = 0
-                    result[technology_csv][operand]["average_present"] = 0
-                    result[technology_csv][operand]["coverage"] = 0
-                    result[technology_csv][operand]["mode"] = 0
+        return UsageTable.from_usage(json.load(operands_usage_file), TECHNOLOGIES)
+
+
+def process_usage(unused=True):
+    # the statistics, and with unused the repos using each operand, from a single load of the usage. The usage CSV is
+    # written with the counts, by save_usage
+    usage = load_usage()
+    calculate_stats(usage)
+    if unused:
+        find_unused(usage)
 
+
+@timed("calculate_stats")
+def calculate_stats(usage=None):
+    usage = usage or load_usage()
+    stats = usage.stats()
+    result = {DISTRIBUTIONS[technology]: stats[technology] for technology in TECHNOLOGIES}
     with open(STATS_PATH, "w+") as stats_json:
         json.dump(result, stats_json, indent=4, sort_keys=True)
-    stats_json_to_csv()
+    stats_json_to_csv(result)
 
 
-def stats_json_to_csv():
-    with open(STATS_PATH, "r") as operands_stats_file, open(STATS_CSV, "w+") as csv_file:
+def stats_json_to_csv(operands_stats=None):
+    if operands_stats is None:
+        with open(STATS_PATH, "r") as operands_stats_file:
+            operands_stats = json.load(operands_stats_file)
+    with open(STATS_CSV, "w+") as csv_file:
         csv_file.write('"distribution","operand","total uses","presence","coverage","median","mode","average_all",'
                        '"average_present"')
-        operands_stats = json.load(operands_stats_file)
         for technology in TECHNOLOGIES:
-            if technology == "rxjs":
-                technology = "RxJS"
-            if technology == "rxjava":
-                technology = "RxJava"
-            if technology == "rxswift":
-                technology = "RxSwift"
-            if technology == "rxkotlin":
-                technology = "RxKotlin"
-            if technology == "rxdart":
-                technology = "RxDart"
-            operands = list(operands_stats[technology].keys())
-            for operand in operands:
+            technology = DISTRIBUTIONS[technology]
+            for operand in sorted(operands_stats[technology]):
                 operand_stats = operands_stats[technology][operand]
                 total_uses = operand_stats["total_uses"]
                 presence = operand_stats["repos_present"]
@@ -253,27 +488,14 @@ def stats_json_to_csv():
                                f',{mode},{average_all},{average_present}')
 
 
-def usage_json_to_csv():
-    with open(USAGE_PATH, "r") as operands_usage_file, open(USAGE_CSV, "w+") as csv_file:
+def usage_json_to_csv(usage=None):
+    table = (usage or load_usage()).table
+    distributions = table["technology"].map(DISTRIBUTIONS).astype(str)
+    lines = "\n" + distributions + "," + table["repo"].astype(str) + "," + table["operand"].astype(str) + "," + \
+        table["count"].astype(str)
+    with open(USAGE_CSV, "w+") as csv_file:
         csv_file.write('"distribution","repo","operand","usage"')
-        operands_usage = json.load(operands_usage_file)
-        for technology in TECHNOLOGIES:
-            if technology == "rxjs":
-                technology_csv = "RxJS"
-            if technology == "rxjava":
-                technology_csv = "RxJava"
-            if technology == "rxswift":
-                technology_csv = "RxSwift"
-            if technology == "rxkotlin":
-                technology_csv = "RxKotlin"
-            if technology == "rxdart":
-                technology_csv = "RxDart"
-            operands = list(operands_usage[technology].keys())
-            for operand in operands:
-                repos = list(operands_usage[technology][operand].keys())
-                for repo in repos:
-                    total_uses = operands_usage[technology][operand][repo]
-                    csv_file.write(f'\n{technology_csv},{repo},{operand},{total_uses}')
+        csv_file.write("".join(lines))
 
 
 # def count_closest_to_pipe(operands, file, project, technology="rxjs"):
@@ -319,73 +541,24 @@ def count_usage_rxjs(path_file, operands, project):
         return operands
 
 
-def find_unused():
-    result = {}
-    with open(USAGE_PATH, "r") as operands_usage_file:
-        operands_usage_full = json.load(operands_usage_file)
-        for technology in TECHNOLOGIES:
-            result[technology] = {}
-            operands_usage = operands_usage_full[technology]
-            operands = list(operands_usage.keys())
-            for operand in operands:
-                repos = list(operands_usage[operand].keys())
-                for repo in repos:
-                    try:
-                        if operands_usage[operand][repo] > 0:
-                            result[technology][repo] += 1
-                    except KeyError:
-                        result[technology][repo] = 0
-            total_used = [i for i in list(result[technology].keys()) if result[technology][i] > 0]
-            total_unused = [i for i in list(result[technology].keys()) if result[technology][i] == 0]
-            print(technology, len(total_used), len(total_unused), "\n", list(total_used), "\n", list(total_unused), "\n", list(result[technology]), "\n")
+def find_unused(usage=None):
+    # repos using at least one operand, with the number of operands they use minus one
+    result = (usage or load_usage()).used_operands()
+    for technology in TECHNOLOGIES:
+        total_used = [i for i in list(result[technology].keys()) if result[technology][i] > 0]
+        total_unused = [i for i in list(result[technology].keys()) if result[technology][i] == 0]
+        print(technology, len(total_used), len(total_unused), "\n", list(total_used), "\n", list(total_unused), "\n", list(result[technology]), "\n")
     with open(UNUSED_PATH, "w+") as unused_json:
         json.dump(result, unused_json, indent=4, sort_keys=True)
-    with open(UNUSED_PATH, "r") as unused_stats_file, open(UNUSED_CSV, "w+") as csv_file:
+    with open(UNUSED_CSV, "w+") as csv_file:
         csv_file.write('"distribution","repos","total uses"')
-        operands_stats = json.load(unused_stats_file)
         for technology in TECHNOLOGIES:
-            repos = list(operands_stats[technology].keys())
-            for repo in repos:
-                total_uses = operands_stats[technology][repo]
+            for repo in sorted(result[technology]):
+                total_uses = result[technology][repo]
                 csv_file.write(f'\n"{technology}","{repo}",{total_uses}')
 
 
-def print_runtime(start_time):
-    total = time.time() - start_time
-    hours = int((total / 3600) % 60)
-    minutes = int((total / 60) % 60)
-    seconds = int(total % 60)
-    print(f"{hours}:{minutes}:{seconds}")
-
-
 if __name__ == "__main__":
-
-    osSleep = None
-    # in Windows, prevent the OS from sleeping while running
-    if os.name == 'nt':
-        osSleep = WindowsInhibitor()
-        osSleep.inhibit()
-        start = time.time()
-        print(datetime.now())
-
-        # if "--clone" in sys.argv or "--all" in sys.argv:
-        #     clone_repos()
-        #     print_runtime(start)
-
-        # if "--flu" in sys.argv or "--all" in sys.argv or "--process" in sys.argv:
-        #     create_file_list_unthreaded()
-        #     print_runtime(start)
-
-        if "--countu" in sys.argv or "--all" in sys.argv or "--process" in sys.argv:
-            count_usage_unthreaded()
-            print_runtime(start)
-
-        if "--stats" in sys.argv or "--all" in sys.argv or "--process" in sys.argv:
-            # find_unused()
-            calculate_stats()
-            print_runtime(start)
-
-        print(datetime.now())
-
-    if osSleep:
-        osSleep.allow()
+    # the command line is the one of the pipeline, e.g. "count --count-mode unthreaded" or "history --samples 6"
+    import pipeline
+    pipeline.main()
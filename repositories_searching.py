@@ -1,45 +1,95 @@
-import time
+import asyncio
+import csv
+import email.utils
+import json
 import datetime
-import pandas
 import os
+import sys
 
-from github import Github
+import requests
+from requests.adapters import HTTPAdapter
 
+from clone_journal import open_journal, read_journal
+from github_api import RATE_LIMITS, SEARCH_PAGE_SIZE, GithubApi, TokenBucket
+from instrumentation import METRICS
 from windows_inhibitor import WindowsInhibitor
 from repositories_processing import TECHNOLOGIES
+from search_planner import SEARCH_LIMIT, partition_queries, plan_queries
+
+CONCURRENCY = 8
+
+
+def extract_repo_info(item, subscribers_count=None):
+    # from the raw search payload, where the Last-Modified of the repository is its updated_at
+    updated_at = datetime.datetime.fromisoformat(item["updated_at"].replace("Z", "+00:00"))
+    repo_dict = {"full_name": item["full_name"],
+                 "forks_count": item["forks_count"],
+                 "has_downloads": item.get("has_downloads"),
+                 "has_issues": item["has_issues"],
+                 "has_pages": item["has_pages"],
+                 "has_wiki": item["has_wiki"],
+                 "id": item["id"],
+                 "language": item["language"],
+                 "last_modified": email.utils.format_datetime(updated_at, usegmt=True),
+                 "name": item["name"],
+                 "owner": item["owner"]["login"],
+                 "size": item["size"],
+                 "stargazers_count": item["stargazers_count"],
+                 "subscribers_count": subscribers_count,
+                 "watchers_count": item["watchers_count"]}
+    return repo_dict
 
 
-def extract_repo_info(repo):
-    repo_dict = {"full_name": repo.full_name,
-                 "forks_count": repo.forks_count,
-                 "has_downloads": repo.has_downloads,
-                 "has_issues": repo.has_issues,
-                 "has_pages": repo.has_pages,
-                 "has_wiki": repo.has_wiki,
-                 "id": repo.id,
-                 "language": repo.language,
-                 "last_modified": repo.last_modified,
-                 "name": repo.name,
-                 "owner": repo.owner.login,
-                 "size": repo.size,
-                 "stargazers_count": repo.stargazers_count,
-                 "subscribers_count": repo.subscribers_count,
-                 "watchers_count": repo.watchers_count}
-    return repo_dict
+REPOSITORY_FIELDS = ["full_name", "forks_count", "has_downloads", "has_issues", "has_pages", "has_wiki", "id",
+                     "language", "last_modified", "name", "owner", "size", "stargazers_count", "subscribers_count",
+                     "watchers_count"]
+
+
+class RepositorySink:
+    '''Append only JSON lines file of the repositories found, flushed every flush_every repositories, so that nothing
+    already collected is lost when a search stops halfway. A repository found again is appended again, and its last
+    record is the one that counts. The file belongs to one search: search_technologies removes it once the CSV is
+    written, and only a search that stopped halfway leaves it to be resumed.'''
+
+    def __init__(self, path, flush_every=100) -> None:
+        self.path = path
+        self.flush_every = flush_every
+        self.buffer = []
+        self.sink_file = open_journal(path)
+
+    def add(self, repo_dict):
+        self.buffer.append(json.dumps(repo_dict, default=str) + "\n")
+        if len(self.buffer) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        self.sink_file.writelines(self.buffer)
+        self.sink_file.flush()
+        os.fsync(self.sink_file.fileno())
+        self.buffer = []
+
+    def close(self):
+        self.flush()
+        self.sink_file.close()
+
+    def to_csv(self, csv_path):
+        # same layout as DataFrame.to_csv, the last record of every repository, by stars like select_repos expects
+        repositories = {repo_dict["id"]: repo_dict for repo_dict in read_journal(self.path)}
+        with open(csv_path, "w", encoding="utf-8", newline="") as csv_file:
+            writer = csv.writer(csv_file, lineterminator="\n")
+            writer.writerow([""] + REPOSITORY_FIELDS)
+            for index, repo_dict in enumerate(sorted(repositories.values(),
+                                                     key=lambda repo: -(repo.get("stargazers_count") or 0))):
+                writer.writerow([index] + [repo_dict.get(field) for field in REPOSITORY_FIELDS])
 
 
 class GithubSearcher:
     token = ""
-    github_client = None
+    github_api = None
 
-    def __init__(self) -> None:
+    def __init__(self, session=None) -> None:
         self.token = self.read_token()
-        self.github_client = Github(self.token)
-        self.total_repositories = pandas.DataFrame(columns=["full_name", "forks_count", "has_downloads", "has_issues",
-                                                            "has_pages", "has_wiki", "id", "language", "last_modified",
-                                                            "name", "owner", "size", "stargazers_count",
-                                                            "subscribers_count", "watchers_count"])
-        print(self.github_client)
+        self.github_api = GithubApi(self.token, session)
 
     @staticmethod
     def read_token():
@@ -49,61 +99,111 @@ class GithubSearcher:
         except FileNotFoundError:
             print("No OAUTH Token")
 
-    def check_rate_limit(self):
-
-        rate_limits = self.github_client.get_rate_limit()
-        if rate_limits.search.remaining == 0:
-            rate_limit = rate_limits.search
-
-        elif rate_limits.core.remaining == 0:
-            rate_limit = rate_limits.core
-
-        else:
-            return
-
-        time_diff = rate_limit.reset - datetime.datetime.utcnow()
-        wait_time = time_diff.total_seconds()
-
-        print(f'Now: {datetime.datetime.now()}\nWait: {int(wait_time / 3600)} hours, {int(wait_time / 60)} '
-              f'minutes, {int(wait_time % 60)} seconds.')
-
-        while wait_time > 100:
-            self.github_client.get_rate_limit()
-            time_diff = rate_limit.reset - datetime.datetime.utcnow()
-            wait_time = time_diff.total_seconds()
-            # print(f'{rate_limit.reset}   {datetime.datetime.utcnow()}')
-            print(f'Now: {datetime.datetime.now()}\nWait: {int(wait_time / 3600)} hours, {int(wait_time / 60)}'
-                  f' minutes, {int(wait_time % 60)} seconds.')
-            time.sleep(30)
-        time.sleep(wait_time)
-        print(f'Remaining Rate Limit:{rate_limits.search.remaining}; {rate_limits.core.remaining}')
-
-    def search(self, query, min_stars, max_stars):
-
-        self.check_rate_limit()
-        query = f'{query} stars:{min_stars}..{max_stars}'
-        query_response = self.github_client.search_repositories(query=query, sort="stars")
-        return query_response, min_stars, max_stars
-
-    def exhaustive_search(self, query="", min_stars=23, max_stars=1000000):
-
-        while max_stars >= 0:
-
-            query_response, min_stars, max_stars = self.search(query, min_stars, max_stars)
-            print(query_response.totalCount, min_stars, max_stars)
-            if query_response.totalCount == 1000 and min_stars + 1 <= max_stars:
-                min_stars = min_stars + 1
-            else:
-                max_stars = min_stars - 1
-                if min_stars - 10 < 0:
-                    min_stars = 0
-                else:
-                    min_stars = min_stars - 10
-
-                for repo in query_response:
-                    self.check_rate_limit()
-                    repo_dict = extract_repo_info(repo)
-                    self.total_repositories = self.total_repositories.append(repo_dict, ignore_index=True)
+    def count(self, query):
+        return self.github_api.count(query)
+
+    def exhaustive_search(self, sink, query="", min_stars=0, max_stars=1000000, split_dates=True):
+
+        windows = plan_queries(self.count, query, min_stars, max_stars, split_dates=split_dates)
+        print(f'{len(windows)} queries for {sum(total for _, total in windows)} repositories')
+        for window_query, total in windows:
+            print(total, window_query)
+            for items in self.github_api.iter_search_pages(window_query, total):
+                subscribers = self.github_api.subscribers_counts([item["node_id"] for item in items])
+                for item in items:
+                    sink.add(extract_repo_info(item, subscribers.get(item["node_id"])))
+            sink.flush()
+        print(f'API calls: {dict(self.github_api.calls)}')
+
+
+class AsyncSearchEngine:
+    '''Runs the searches of several technologies at once. The calls go through a pool of tokens, each with its own
+    buckets for the search, core and graphql limits, and always use the token that is available soonest.'''
+
+    def __init__(self, tokens, session=None, concurrency=CONCURRENCY) -> None:
+        if session is None:
+            session = requests.Session()
+            session.mount("https://", HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency))
+        self.apis = [GithubApi(token, session) for token in tokens or [None]]
+        self.buckets = [{resource: TokenBucket(*limit) for resource, limit in RATE_LIMITS.items()} for _ in self.apis]
+        self.slots = asyncio.Semaphore(concurrency)
+        # one lock per resource, so that a throttled resource does not hold back the calls of the others
+        self.locks = {resource: asyncio.Lock() for resource in RATE_LIMITS}
+
+    async def acquire(self, resource):
+        async with self.locks[resource]:
+            while True:
+                delay, index = min((buckets[resource].delay(), index) for index, buckets in enumerate(self.buckets))
+                if delay == 0:
+                    self.buckets[index][resource].take()
+                    return index
+                await asyncio.sleep(delay)
+                METRICS.add_time("api_wait", delay, resource)
+
+    async def call(self, resource, method, *args):
+        index = await self.acquire(resource)
+        api = self.apis[index]
+        async with self.slots:
+            result = await asyncio.to_thread(getattr(api, method), *args)
+        if resource in api.rate_limits.limits:
+            self.buckets[index][resource].sync(*api.rate_limits.limits[resource])
+        return result
+
+    async def plan(self, query, min_stars=0, max_stars=1000000, split_dates=True):
+        planner = partition_queries(query, min_stars, max_stars, split_dates=split_dates)
+        try:
+            next_query = next(planner)
+            while True:
+                next_query = planner.send(await self.call("search", "count", next_query))
+        except StopIteration as stop:
+            return stop.value
+
+    async def fetch_page(self, window_query, page):
+        _, items = await self.call("search", "search_repositories", window_query, page)
+        subscribers = await self.call("graphql", "subscribers_counts", [item["node_id"] for item in items])
+        return items, subscribers
+
+    async def search(self, sink, query, min_stars=0, max_stars=1000000, split_dates=True):
+        # windows in order, so the results stay sorted by stars, and the pages of a window at once
+        windows = await self.plan(query, min_stars, max_stars, split_dates)
+        print(f'{query}: {len(windows)} queries for {sum(total for _, total in windows)} repositories')
+        for window_query, total in windows:
+            pages = -(-min(total, SEARCH_LIMIT) // SEARCH_PAGE_SIZE)
+            results = await asyncio.gather(*(self.fetch_page(window_query, page) for page in range(1, pages + 1)))
+            for items, subscribers in results:
+                for item in items:
+                    sink.add(extract_repo_info(item, subscribers.get(item["node_id"])))
+            sink.flush()
+
+    async def search_all(self, sinks, **kwargs):
+        await asyncio.gather(*(self.search(sink, query, **kwargs) for query, sink in sinks.items()))
+        calls = {}
+        for api in self.apis:
+            for resource, total in api.calls.items():
+                calls[resource] = calls.get(resource, 0) + total
+        print(f'API calls: {calls}')
+
+
+def read_tokens():
+    # one token per line, all of them used as a pool
+    try:
+        with open("github.token") as f:
+            return [line.strip() for line in f if line.strip()]
+    except FileNotFoundError:
+        print("No OAUTH Token")
+        return []
+
+
+def search_technologies(technologies=TECHNOLOGIES, csv_path="CSVs", split_dates=True):
+    # every technology is its own query, searched at once, into CSVs/<technology>.csv. split_dates splits the single
+    # star values with more results than a search returns by creation date
+    os.makedirs(csv_path, exist_ok=True)
+    sinks = {technology: RepositorySink(f'{csv_path}/{technology}.jsonl') for technology in technologies}
+    asyncio.run(AsyncSearchEngine(read_tokens()).search_all(sinks, split_dates=split_dates))
+    for technology, repositories in sinks.items():
+        repositories.close()
+        repositories.to_csv(f'{csv_path}/{technology}.csv')
+        os.remove(repositories.path)
 
 
 if __name__ == "__main__":
@@ -114,10 +214,7 @@ if __name__ == "__main__":
         osSleep = WindowsInhibitor()
         osSleep.inhibit()
 
-        for technology in TECHNOLOGIES:
-            g = GithubSearcher()
-            g.exhaustive_search(technology)
-            g.total_repositories.to_csv(f'CSVs\\{technology}.csv')
+    search_technologies(split_dates="--no-split-dates" not in sys.argv)
 
     if osSleep:
         osSleep.allow()
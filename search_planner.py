@@ -0,0 +1,132 @@
+import datetime
+import math
+
+# GitHub never returns more than this many results for one search query
+SEARCH_LIMIT = 1000
+# the first created: range is open ended, so that repos from before this date (GitHub has some from 2007) are kept.
+# So is the last one, that ends today, for the repos created since, or already on a later day in UTC
+FIRST_REPO_DATE = datetime.date(2008, 1, 1)
+
+
+def star_qualifier(query, min_stars, max_stars):
+    return f'{query} stars:{min_stars}..{max_stars}'.strip()
+
+
+def date_qualifier(query, first_date, last_date):
+    if first_date <= FIRST_REPO_DATE and last_date >= datetime.date.today():
+        return query
+    if first_date <= FIRST_REPO_DATE:
+        return f'{query} created:<={last_date.isoformat()}'
+    if last_date >= datetime.date.today():
+        return f'{query} created:>={first_date.isoformat()}'
+    return f'{query} created:{first_date.isoformat()}..{last_date.isoformat()}'
+
+
+def partition_queries(query, min_stars, max_stars, limit=SEARCH_LIMIT, split_dates=True, counts=None):
+    '''Plans a covering, non overlapping set of queries with fewer than limit results each, highest stars first.
+    Star ranges (and, for single star values over the limit, created: ranges) are bisected on the result counts.
+
+    This is a generator: it yields the queries it needs counted, the caller sends back their totalCount, and the plan
+    is returned as [(query, count)]. counts caches the probes, and can be reused between plans. A window that still
+    has limit results or more, that can not be fetched whole, is warned about.'''
+    counts = {} if counts is None else counts
+    # (min stars, max stars, created range or None, count)
+    windows = []
+
+    def probe(window_query):
+        if window_query not in counts:
+            counts[window_query] = yield window_query
+        return counts[window_query]
+
+    def add_window(low, high, dates, total):
+        if total >= limit:
+            print(f"Warning: {window_query(query, low, high, dates)} has {total} results, only the first {limit} "
+                  f"can be fetched")
+        windows.append((low, high, dates, total))
+
+    def split_days(stars, first_date, last_date):
+        total = yield from probe(date_qualifier(star_qualifier(query, stars, stars), first_date, last_date))
+        if total < limit or first_date == last_date:
+            add_window(stars, stars, (first_date, last_date), total)
+            return
+        middle = first_date + (last_date - first_date) // 2
+        yield from split_days(stars, middle + datetime.timedelta(days=1), last_date)
+        yield from split_days(stars, first_date, middle)
+
+    def split_stars(low, high):
+        total = yield from probe(star_qualifier(query, low, high))
+        if total < limit:
+            add_window(low, high, None, total)
+        elif low == high:
+            if split_dates:
+                yield from split_days(low, FIRST_REPO_DATE, datetime.date.today())
+            else:
+                add_window(low, high, None, total)
+        else:
+            # stars are heavy tailed, so wide ranges are split around their geometric middle
+            middle = int(math.sqrt(low * high)) if low > 0 and high > 4 * low else (low + high) // 2
+            middle = min(max(middle, low), high - 1)
+            yield from split_stars(middle + 1, high)
+            yield from split_stars(low, middle)
+
+    yield from split_stars(min_stars, max_stars)
+    return [(window_query(query, *window[:3]), window[3]) for window in merge_windows(windows, limit)]
+
+
+def merge_windows(windows, limit=SEARCH_LIMIT):
+    # star ranges are disjoint, so the count of two neighbouring ranges is the sum of their counts
+    merged = []
+    for low, high, dates, total in windows:
+        if merged and dates is None and merged[-1][2] is None and merged[-1][3] + total < limit:
+            merged[-1] = (low, merged[-1][1], None, merged[-1][3] + total)
+        else:
+            merged.append((low, high, dates, total))
+    return merged
+
+
+def window_query(query, min_stars, max_stars, dates=None):
+    if dates is None:
+        return star_qualifier(query, min_stars, max_stars)
+    return date_qualifier(star_qualifier(query, min_stars, max_stars), *dates)
+
+
+def plan_queries(count, query="", min_stars=0, max_stars=1000000, limit=SEARCH_LIMIT, split_dates=True,
+                 counts=None):
+    planner = partition_queries(query, min_stars, max_stars, limit, split_dates, counts)
+    try:
+        next_query = next(planner)
+        while True:
+            next_query = planner.send(count(next_query))
+    except StopIteration as stop:
+        return stop.value
+
+
+def search_calls(windows, per_page=100):
+    return sum(math.ceil(min(total, SEARCH_LIMIT) / per_page) for _, total in windows)
+
+
+def legacy_search_calls(count, query="", min_stars=23, max_stars=1000000, per_page=30):
+    # search calls of the original exhaustive_search: one per star window tried, plus the result pages
+    calls = 0
+    while max_stars >= 0:
+        total = min(count(star_qualifier(query, min_stars, max_stars)), SEARCH_LIMIT)
+        calls += 1
+        if total == SEARCH_LIMIT and min_stars + 1 <= max_stars:
+            min_stars = min_stars + 1
+        else:
+            calls += math.ceil(total / per_page)
+            max_stars = min_stars - 1
+            min_stars = max(min_stars - 10, 0)
+    return calls
+
+
+def compare_api_calls(count, query="", min_stars=0, max_stars=1000000, split_dates=True, per_page=100):
+    probes = {}
+    windows = plan_queries(count, query, min_stars, max_stars, split_dates=split_dates, counts=probes)
+    report = {"windows": len(windows),
+              "planner_probes": len(probes),
+              "planner_pages": search_calls(windows, per_page),
+              "legacy_calls": legacy_search_calls(count, query, max_stars=max_stars)}
+    report["planner_calls"] = report["planner_probes"] + report["planner_pages"]
+    print(report)
+    return report
@@ -0,0 +1,82 @@
+import datetime
+import random
+import re
+import time
+from urllib.parse import parse_qs, urlparse
+
+QUALIFIERS = re.compile(r"stars:(\d+)\.\.(\d+)(?: created:(?:<=(\S+)|>=(\S+)|(\S+)\.\.(\S+)))?")
+
+
+def fake_repos(seed=0, total=3000, zero_stars=1275):
+    '''(stars, created, id) of total repos, with zero_stars of them at 0 stars, more than one search returns, and
+    repos from before 2008.'''
+    rnd = random.Random(seed)
+    first = datetime.date(2007, 10, 1)
+    days = (datetime.date(2024, 1, 1) - first).days
+    return [(0 if index < zero_stars else int(rnd.paretovariate(0.8)), first + datetime.timedelta(rnd.randrange(days)),
+             index + 1) for index in range(total)]
+
+
+def matching(repos, query):
+    low, high, until, since, first_date, last_date = QUALIFIERS.search(query).groups()
+    first_date, last_date = first_date or since, last_date or until
+    first_date = datetime.date.fromisoformat(first_date) if first_date else datetime.date.min
+    last_date = datetime.date.fromisoformat(last_date) if last_date else datetime.date.max
+    return [repo for repo in repos if int(low) <= repo[0] <= int(high) and first_date <= repo[1] <= last_date]
+
+
+def search_item(repo):
+    stars, created, repo_id = repo
+    return {"id": repo_id, "node_id": f"R_{repo_id}", "full_name": f"owner{repo_id}/repo{repo_id}",
+            "name": f"repo{repo_id}", "owner": {"login": f"owner{repo_id}"}, "forks_count": 0, "has_issues": True,
+            "has_pages": False, "has_wiki": True, "language": "Java", "size": 10, "stargazers_count": stars,
+            "watchers_count": stars, "updated_at": f"{created.isoformat()}T00:00:00Z"}
+
+
+class FakeResponse:
+
+    def __init__(self, status_code=200, payload=None, headers=None, text="") -> None:
+        self.status_code = status_code
+        self.payload = payload
+        self.headers = headers or {}
+        self.text = text
+
+    def json(self):
+        return self.payload
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"{self.status_code} {self.text}")
+
+
+class FakeSession:
+    '''The search and GraphQL (for a token only) endpoints of GitHub over repos, with the rate limit headers of an
+    unused token. The responses of failures are returned first, one per call.'''
+
+    def __init__(self, repos=(), failures=(), delay=0) -> None:
+        self.repos = list(repos)
+        self.failures = list(failures)
+        self.delay = delay
+        self.calls = []
+
+    def request(self, method, url, headers=None, params=None, json=None):
+        self.calls.append(url)
+        if self.delay:
+            time.sleep(self.delay)
+        if self.failures:
+            return self.failures.pop(0)
+        reset = str(int(time.time()) + 3600)
+        if url.endswith("/graphql") and "Authorization" not in (headers or {}):
+            return FakeResponse(401, text='{"message": "This endpoint requires you to be authenticated."}')
+        if url.endswith("/graphql"):
+            nodes = [{"id": node_id, "watchers": {"totalCount": 1}} for node_id in json["variables"]["ids"]]
+            return FakeResponse(payload={"data": {"nodes": nodes}},
+                                headers={"X-RateLimit-Resource": "graphql", "X-RateLimit-Remaining": "4999",
+                                         "X-RateLimit-Reset": reset})
+        params = params or parse_qs(urlparse(url).query)
+        found = sorted(matching(self.repos, params["q"]), key=lambda repo: (-repo[0], repo[2]))
+        page, per_page = int(params.get("page", 1)), int(params.get("per_page", 30))
+        items = [search_item(repo) for repo in found[:1000][(page - 1) * per_page:page * per_page]]
+        return FakeResponse(payload={"total_count": len(found), "items": items},
+                            headers={"X-RateLimit-Resource": "search", "X-RateLimit-Remaining": "29",
+                                     "X-RateLimit-Reset": reset})
@@ -0,0 +1,92 @@
+import json
+import os
+import shutil
+import subprocess
+
+import pandas
+
+from clone_journal import CloneJournal
+from repositories_processing import CLONE_JOURNAL, GRAY_LIST_PATH, clone_repos
+
+REPOS = ["alice/first", "bob/second", "carol/missing"]
+
+
+def git(*args, cwd=None):
+    subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True)
+
+
+def make_remotes(root):
+    # bare remotes for every repo of REPOS but the missing one, with a commit each
+    for full_name in REPOS[:-1]:
+        work = f"{root}/work/{full_name}"
+        os.makedirs(work)
+        git("init", "-q", work)
+        with open(f"{work}/Main.java", "w") as source:
+            source.write(f"class Main {{ String name = \"{full_name}\"; }}\n")
+        git("add", "-A", cwd=work)
+        git("-c", "user.name=test", "-c", "user.email=test@example.com", "commit", "-q", "-m", "first", cwd=work)
+        git("clone", "-q", "--bare", work, f"{root}/remotes/{full_name}.git")
+    return f"file://{root}/remotes/{{full_name}}.git"
+
+
+def setup(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("CSVs")
+    pandas.DataFrame([{"full_name": full_name, "owner": full_name.split("/")[0], "name": full_name.split("/")[1],
+                       "stargazers_count": 100 - index} for index, full_name in enumerate(REPOS)]) \
+        .to_csv("CSVs/rxjava.csv", index=False)
+    with open(GRAY_LIST_PATH, "w") as gray_list_file:
+        json.dump({"blacklist": []}, gray_list_file)
+    return make_remotes(tmp_path)
+
+
+def clone(remote_url):
+    clone_repos(n_jobs=2, remote_url=remote_url, technologies=["rxjava"])
+    journal = CloneJournal(f"repos/{CLONE_JOURNAL}")
+    journal.close()
+    return journal
+
+
+def test_clone_records_done_and_failed(tmp_path, monkeypatch):
+    journal = clone(setup(tmp_path, monkeypatch))
+    assert os.path.exists("repos/rxjava/alice_first/Main.java")
+    assert os.path.exists("repos/rxjava/bob_second/Main.java")
+    assert journal.state("rxjava/alice_first") == journal.state("rxjava/bob_second") == CloneJournal.DONE
+    assert journal.state("rxjava/carol_missing") == CloneJournal.FAILED
+    assert "carol/missing.git" in journal.states["rxjava/carol_missing"]["reason"]
+
+
+def test_resume_skips_cloned_repos(tmp_path, monkeypatch):
+    remote_url = setup(tmp_path, monkeypatch)
+    # on disk before the first run, and never cloned
+    os.makedirs("repos/rxjava/alice_first")
+    journal = clone(remote_url)
+    assert journal.states["rxjava/alice_first"]["reason"] == "already present"
+    assert os.listdir("repos/rxjava/alice_first") == []
+    with open("repos/rxjava/bob_second/marker", "w"):
+        pass
+    journal = clone(remote_url)
+    # done and still there: kept as it is, the failed one is tried again
+    assert os.path.exists("repos/rxjava/bob_second/marker")
+    assert journal.state("rxjava/carol_missing") == CloneJournal.FAILED
+    with open(f"repos/{CLONE_JOURNAL}") as journal_file:
+        entries = [json.loads(line) for line in journal_file]
+    assert [entry["state"] for entry in entries if entry["repo"] == "rxjava/carol_missing"] == \
+        [CloneJournal.PENDING, CloneJournal.FAILED] * 2
+    assert [entry["state"] for entry in entries if entry["repo"] == "rxjava/bob_second"] == \
+        [CloneJournal.PENDING, CloneJournal.DONE]
+
+
+def test_resume_clones_removed_and_interrupted_repos(tmp_path, monkeypatch):
+    remote_url = setup(tmp_path, monkeypatch)
+    clone(remote_url)
+    # done but removed since, and interrupted halfway
+    shutil.rmtree("repos/rxjava/alice_first")
+    shutil.rmtree("repos/rxjava/bob_second/.git")
+    journal = CloneJournal(f"repos/{CLONE_JOURNAL}")
+    journal.record("rxjava/bob_second", CloneJournal.PENDING)
+    journal.close()
+    journal = clone(remote_url)
+    assert journal.state("rxjava/alice_first") == journal.state("rxjava/bob_second") == CloneJournal.DONE
+    assert os.path.exists("repos/rxjava/alice_first/Main.java")
+    assert os.path.exists("repos/rxjava/bob_second/.git")
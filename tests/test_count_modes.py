@@ -0,0 +1,107 @@
+import json
+import os
+import shutil
+import sys
+
+import pytest
+from joblib.externals.loky import get_reusable_executor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import repositories_processing as processing  # noqa: E402
+from content_dedup import create_blob_index  # noqa: E402
+from file_ingest import FileReader  # noqa: E402
+from synthetic_corpus import generate_corpus  # noqa: E402
+
+# the ways to count a corpus, that must all give the operands_usage.json of count_usage_unthreaded without a cache
+MODES = {"threaded": lambda: processing.count_usage_threaded(n_jobs=2, shard_size=7, use_cache=False),
+         "unthreaded cached": lambda: processing.count_usage_unthreaded(use_cache=True),
+         "threaded cached": lambda: processing.count_usage_threaded(n_jobs=2, shard_size=7, use_cache=True),
+         "unthreaded dedup": lambda: processing.count_usage_unthreaded(use_cache=False, dedup=True),
+         "threaded dedup": lambda: processing.count_usage_threaded(n_jobs=2, shard_size=7, use_cache=False,
+                                                                   dedup=True),
+         "threaded cached dedup": lambda: processing.count_usage_threaded(n_jobs=2, shard_size=7, use_cache=True,
+                                                                          dedup=True)}
+
+
+@pytest.fixture(scope="module")
+def corpus(tmp_path_factory):
+    root = generate_corpus(str(tmp_path_factory.mktemp("corpus") / "corpus"), seed=4, repos=3, files=20,
+                           file_size=1024, forks=1)
+    cwd = os.getcwd()
+    os.chdir(root)
+    try:
+        processing.create_file_list_unthreaded()
+        for technology in processing.TECHNOLOGIES:
+            create_blob_index(technology, n_jobs=1)
+    finally:
+        os.chdir(cwd)
+    return root
+
+
+@pytest.fixture
+def workdir(corpus, tmp_path, monkeypatch):
+    # a copy of the corpus, with the mtimes that the cache and blob indexes compare
+    shutil.copytree(corpus, tmp_path / "corpus", copy_function=shutil.copy2)
+    monkeypatch.chdir(tmp_path / "corpus")
+    # joblib reuses its workers, which keep the working directory they started in
+    get_reusable_executor().shutdown(wait=True)
+    return tmp_path / "corpus"
+
+
+def usage(count):
+    if os.path.exists(processing.USAGE_PATH):
+        os.remove(processing.USAGE_PATH)
+    count()
+    with open(processing.USAGE_PATH, "r") as usage_json:
+        return json.load(usage_json)
+
+
+def baseline():
+    return usage(lambda: processing.count_usage_unthreaded(use_cache=False))
+
+
+def test_modes_count_alike(workdir):
+    expected = baseline()
+    assert any(count for operands in expected.values() for repos in operands.values() for count in repos.values())
+    for mode, count in MODES.items():
+        # the cached modes run twice, cold and warm
+        assert usage(count) == expected, mode
+        assert usage(count) == expected, mode
+
+
+def test_changed_files_count_alike(workdir):
+    for count in MODES.values():
+        usage(count)
+    with open("indexes/rxjava.txt", "r") as file_list_file:
+        files = sorted(file for file in file_list_file.read().split("\n") if file)
+    # the same size with other content, and the same content with another mtime for the content hash fallback
+    with open(f"repos/{files[0]}", "rb") as source:
+        content = source.read()
+    assert b"." in content
+    with open(f"repos/{files[0]}", "wb") as source:
+        source.write(content.replace(b".", b","))
+    stat = os.stat(f"repos/{files[1]}")
+    os.utime(f"repos/{files[1]}", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    expected = baseline()
+    for mode, count in MODES.items():
+        assert usage(count) == expected, mode
+    reader = FileReader()
+    assert usage(lambda: processing.count_usage_threaded(n_jobs=2, use_cache=True, reader=reader)) == expected
+    assert reader.stats["cached_files"] > 0
+
+
+def test_exclude_duplicates_leaves_out_the_forks(workdir):
+    expected = baseline()
+    forks = {repo for operands in expected.values() for repos in operands.values() for repo in repos
+             if repo.startswith("fork")}
+    assert forks
+    for count in [lambda: processing.count_usage_unthreaded(use_cache=False, duplicate_threshold=0.8),
+                  lambda: processing.count_usage_threaded(n_jobs=2, use_cache=False, duplicate_threshold=0.8)]:
+        assert usage(count) == {technology: {operand: {repo: repo_count for repo, repo_count in repos.items()
+                                                        if repo not in forks}
+                                             for operand, repos in operands.items()}
+                                for technology, operands in expected.items()}
+    with open(processing.DUPLICATE_REPOS_PATH, "r") as duplicates_json:
+        duplicates = json.load(duplicates_json)
+    assert {repo for repos in duplicates.values() for repo in repos} == forks
@@ -0,0 +1,71 @@
+import asyncio
+import csv
+
+import pytest
+
+import github_api
+import repositories_searching
+from clone_journal import read_journal
+from fake_github import FakeResponse, FakeSession, fake_repos
+from github_api import GithubApi
+from repositories_searching import AsyncSearchEngine, GithubSearcher, RepositorySink
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    slept = []
+    monkeypatch.setattr(github_api.time, "sleep", slept.append)
+    return slept
+
+
+def test_permission_error_is_not_retried(sleeps):
+    session = FakeSession(failures=[FakeResponse(403, headers={"X-RateLimit-Remaining": "4000"},
+                                                 text='{"message": "Resource not accessible by integration"}')])
+    with pytest.raises(RuntimeError):
+        GithubApi("token", session).count("stars:0..10")
+    assert len(session.calls) == 1
+    assert sleeps == []
+
+
+def test_secondary_rate_limit_is_retried(sleeps):
+    secondary = FakeResponse(403, headers={"X-RateLimit-Remaining": "20"},
+                             text='{"message": "You have exceeded a secondary rate limit."}')
+    session = FakeSession(fake_repos(total=10, zero_stars=0), failures=[secondary, secondary])
+    assert GithubApi("token", session).count("stars:0..1000000") == 10
+    assert len(session.calls) == 3
+    assert sleeps == [github_api.SECONDARY_LIMIT_WAIT, github_api.SECONDARY_LIMIT_WAIT * 2]
+
+
+def test_retry_after_is_honoured(sleeps):
+    session = FakeSession(fake_repos(total=10, zero_stars=0),
+                          failures=[FakeResponse(429, headers={"Retry-After": "7"})])
+    assert GithubApi("token", session).count("stars:0..1000000") == 10
+    assert sleeps == [7]
+
+
+def test_search_calls_per_repository(tmp_path, monkeypatch, sleeps):
+    # raw payloads: a count per planned window, a search call per page of 100 and a GraphQL call per page
+    monkeypatch.chdir(tmp_path)
+    repos = fake_repos(total=2517, zero_stars=0)
+    session = FakeSession(repos)
+    sink = RepositorySink(str(tmp_path / "rxjava.jsonl"))
+    GithubSearcher(session).exhaustive_search(sink, "rxjava")
+    sink.close()
+    assert len({repo_dict["id"] for repo_dict in read_journal(str(tmp_path / "rxjava.jsonl"))}) == len(repos)
+    assert len(session.calls) / len(repos) < 0.05
+
+
+def test_search_without_token_leaves_subscribers_unknown(tmp_path, monkeypatch):
+    monkeypatch.setattr(repositories_searching, "RATE_LIMITS",
+                        {resource: (100000, 1) for resource in repositories_searching.RATE_LIMITS})
+    repos = fake_repos(total=250, zero_stars=0)
+    session = FakeSession(repos)
+    sink = RepositorySink(str(tmp_path / "rxjava.jsonl"))
+    asyncio.run(AsyncSearchEngine([], session=session).search_all({"rxjava": sink}))
+    sink.close()
+    sink.to_csv(str(tmp_path / "rxjava.csv"))
+    with open(tmp_path / "rxjava.csv", "r", encoding="utf-8", newline="") as csv_file:
+        rows = list(csv.DictReader(csv_file))
+    assert len(rows) == len(repos)
+    assert {row["subscribers_count"] for row in rows} == {""}
+    assert not any(url.endswith("/graphql") for url in session.calls)
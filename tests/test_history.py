@@ -0,0 +1,81 @@
+import csv
+import json
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from blob_scanner import scan_history
+from repositories_processing import (OPERANDS_PATH, PRUNED_FOLDERS, REPO_LIST_PATH, TECHNOLOGIES, USAGE_HISTORY_CSV,
+                                     count_usage_git, count_usage_history, is_source_file)
+from usage_scanner import matcher_of
+
+PACKAGE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# (files written, files removed) of every commit
+COMMITS = [({"src/main/java/A.java": "a.map(x); a.filter(y);", "src/test/java/T.java": "t.map(x);"}, []),
+           ({"src/main/java/B.java": "b.map(x);", "README.md": ".map(x)"}, []),
+           ({"src/main/java/A.java": "a.take(1);", "node_modules/N.java": "n.map(x);"}, []),
+           ({"src/main/java/sub/C.java": "c.map(x); c.map(y);"}, ["src/main/java/B.java"])]
+
+
+def git(path, *args):
+    subprocess.run(["git", "-c", "user.name=test", "-c", "user.email=test@test", *args], cwd=path, check=True,
+                   capture_output=True)
+
+
+def make_repo(path):
+    os.makedirs(path)
+    git(path, "init", "-q")
+    for index, (written, removed) in enumerate(COMMITS):
+        for file, text in written.items():
+            os.makedirs(os.path.dirname(f"{path}/{file}"), exist_ok=True)
+            with open(f"{path}/{file}", "w") as source:
+                source.write(text)
+        for file in removed:
+            os.remove(f"{path}/{file}")
+        git(path, "add", "-A")
+        git(path, "commit", "-q", "-m", f"commit {index}")
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("indexes")
+    shutil.copy(f"{PACKAGE_PATH}/{OPERANDS_PATH}", OPERANDS_PATH)
+    for technology in TECHNOLOGIES:
+        os.makedirs(f"repos/{technology}")
+    make_repo("repos/rxjava/owner_good")
+    # a clone that lost its .git, and one without any commit
+    make_repo("repos/rxjava/owner_broken")
+    shutil.rmtree("repos/rxjava/owner_broken/.git")
+    os.makedirs("repos/rxjava/owner_empty")
+    git("repos/rxjava/owner_empty", "init", "-q")
+    repo_list = {technology: [] for technology in TECHNOLOGIES}
+    repo_list["rxjava"] = ["owner_broken", "owner_empty", "owner_good"]
+    with open(REPO_LIST_PATH, "w") as repo_list_file:
+        json.dump(repo_list, repo_list_file)
+    with open(OPERANDS_PATH, "r") as operands_file:
+        return json.load(operands_file)
+
+
+def test_snapshots_match_count_usage_git(corpus):
+    matcher = matcher_of("rxjava", corpus["rxjava"].keys())
+    history, _ = scan_history(matcher, "repos/rxjava/owner_good", samples=10,
+                              path_filter=lambda path: is_source_file("rxjava", path), prefix="rxjava/owner_good/",
+                              pruned_folders=PRUNED_FOLDERS)
+    assert len(history) == len(COMMITS)
+    for commit, _, counts, _ in history:
+        operands = {technology: {operand: {} for operand in corpus[technology]} for technology in corpus}
+        usage = count_usage_git(operands, ["rxjava"], rev=commit)["rxjava"]
+        assert {operand: usage[operand]["owner_good"] for operand in usage} == \
+            {operand: counts[operand] for operand in usage}
+    assert history[-1][2]["map"] == 2
+
+
+def test_bad_repositories_are_skipped(corpus):
+    count_usage_history(samples=10)
+    with open(USAGE_HISTORY_CSV, "r", newline="") as csv_file:
+        rows = list(csv.DictReader(csv_file))
+    assert {row["repo"] for row in rows} == {"owner_good"}
+    assert len({row["commit"] for row in rows}) == len(COMMITS)
@@ -0,0 +1,66 @@
+import os
+
+import pytest
+
+from repositories_processing import create_file_list, is_source_file
+
+# every file of the tree, and whether the index of its technology lists it
+TREE = {"rxjava/owner_app/src/main/java/App.java": True,
+        "rxjava/owner_app/src/main/java/io/Util.java": True,
+        "rxjava/owner_app/src/main/java/App.kt": False,
+        "rxjava/owner_app/src/main/resources/App.java.txt": False,
+        "rxjava/owner_app/src/test/java/AppTest.java": False,
+        "rxjava/owner_app/App.java": False,
+        "rxjava/owner_app/build/src/main/java/Generated.java": False,
+        "rxjava/owner_app/src/main/java/build/Generated.java": False,
+        "rxjava/owner_app/.git/src/main/java/Object.java": False,
+        "rxjava/owner_lib/module/src/main/java/Lib.java": True,
+        "rxjs/owner_web/src/index.ts": True,
+        "rxjs/owner_web/src/index.js": True,
+        "rxjs/owner_web/src/Program.cs": True,
+        "rxjs/owner_web/src/index.d.ts.map": False,
+        "rxjs/owner_web/src/index.tsx": False,
+        "rxjs/owner_web/README.md": False,
+        "rxjs/owner_web/test/index.spec.ts": True,
+        "rxjs/owner_web/node_modules/rxjs/index.js": False,
+        "rxjs/owner_web/packages/a/node_modules/b/index.ts": False,
+        "rxjs/owner_web/build/bundle.js": False,
+        "rxjs/owner_web/.git/hooks/pre-commit.js": False,
+        "rxswift/owner_ios/Sources/App.swift": True,
+        "rxswift/owner_ios/Pods/RxSwift/Observable.swift": False,
+        "rxswift/owner_ios/App.m": False,
+        "rxkotlin/owner_android/src/main/kotlin/App.kt": True,
+        "rxkotlin/owner_android/src/main/kotlin/Legacy.java": True,
+        "rxkotlin/owner_android/src/main/java/Other.kt": False,
+        "rxkotlin/owner_android/src/test/kotlin/AppTest.kt": False,
+        "rxkotlin/owner_android/app/build/src/main/kotlin/Generated.kt": False}
+TECHNOLOGIES = sorted({file.split("/")[0] for file in TREE})
+
+
+@pytest.fixture
+def tree(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("indexes")
+    for file in TREE:
+        os.makedirs(os.path.dirname(f"repos/{file}"), exist_ok=True)
+        with open(f"repos/{file}", "w") as source:
+            source.write("x.map(y);\n")
+    return tmp_path
+
+
+@pytest.mark.parametrize("technology", TECHNOLOGIES)
+def test_index_lists_the_source_files(tree, technology):
+    create_file_list(technology)
+    with open(f"indexes/{technology}.txt", "r", encoding="utf-8") as file_list_file:
+        assert file_list_file.read().split("\n") == \
+            sorted(file for file, listed in TREE.items() if listed and file.startswith(f"{technology}/")) + [""]
+
+
+@pytest.mark.parametrize("technology", TECHNOLOGIES)
+def test_is_source_file_accepts_the_indexed_files(tree, technology):
+    create_file_list(technology)
+    with open(f"indexes/{technology}.txt", "r", encoding="utf-8") as file_list_file:
+        indexed = set(file for file in file_list_file.read().split("\n") if file)
+    files = {os.path.relpath(f"{folder}/{name}", "repos") for folder, _, names in os.walk(f"repos/{technology}")
+             for name in names}
+    assert {file for file in files if is_source_file(technology, file)} == indexed
@@ -0,0 +1,72 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from pipeline import Pipeline, Stage, build_stages, parse_arguments
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_profiled_stages_do_not_overlap(tmp_path):
+    running = []
+    overlaps = []
+
+    def run(output):
+        running.append(1)
+        overlaps.append(len(running))
+        time.sleep(0.05)
+        running.pop()
+        output.write_text("done")
+
+    outputs = [tmp_path / f"output{index}.txt" for index in range(3)]
+    stages = [Stage(f"stage{index}", lambda output=output: run(output), outputs=[str(output)])
+              for index, output in enumerate(outputs)]
+    failed = Pipeline(stages, str(tmp_path / "state.json")).run([stage.name for stage in stages], max_workers=3,
+                                                               profile_path=str(tmp_path / "profiles"))
+    assert failed == []
+    assert max(overlaps) == 1
+    assert sorted(os.listdir(tmp_path / "profiles")) == ["stage0.prof", "stage1.prof", "stage2.prof"]
+
+
+def test_stage_is_skipped_while_up_to_date(tmp_path):
+    calls = []
+    output = tmp_path / "output.txt"
+
+    def run():
+        calls.append(1)
+        output.write_text("done")
+
+    pipeline = Pipeline([Stage("write", run, outputs=[str(output)])], str(tmp_path / "state.json"))
+    assert pipeline.run(["write"]) == []
+    assert pipeline.run(["write"]) == []
+    assert len(calls) == 1
+
+
+def test_history_target():
+    args = parse_arguments(["history", "--samples", "6", "--sample-by", "month", "--rev", "main"])
+    history = {stage.name: stage for stage in build_stages(args)}["history"]
+    assert args.targets == ["history"]
+    assert history.config == {"rev": "main", "samples": 6, "sample_by": "month", "tokenize": False,
+                              "rxjs_pipe": False, "ingest_policy": "scan", "max_file_size": args.max_file_size}
+    assert "history" not in {stage.name: stage for stage in build_stages(parse_arguments([]))}["stats"].depends
+
+
+@pytest.mark.parametrize("argv", [["--countt"], ["count", "--sample-by", "week"], ["--samples"]])
+def test_unknown_arguments_fail(argv):
+    with pytest.raises(SystemExit) as exit_info:
+        parse_arguments(argv)
+    assert exit_info.value.code == 2
+
+
+@pytest.mark.parametrize("script", ["pipeline.py", "repositories_processing.py"])
+def test_one_command_line(script):
+    # repositories_processing.py runs the pipeline, with its arguments
+    help_run = subprocess.run([sys.executable, script, "--help"], cwd=ROOT, capture_output=True, text=True)
+    assert help_run.returncode == 0
+    assert "--sample-by" in help_run.stdout and "--count-mode" in help_run.stdout
+    flag_run = subprocess.run([sys.executable, script, "--countu"], cwd=ROOT, capture_output=True, text=True)
+    assert flag_run.returncode == 2
+    assert "unrecognized arguments: --countu" in flag_run.stderr
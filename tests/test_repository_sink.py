@@ -0,0 +1,41 @@
+import csv
+
+from repositories_searching import RepositorySink
+
+
+def record(repo_id, stars):
+    return {"id": repo_id, "full_name": f"owner/repo{repo_id}", "name": f"repo{repo_id}", "owner": "owner",
+            "stargazers_count": stars}
+
+
+def read_csv(csv_path):
+    with open(csv_path, "r", encoding="utf-8", newline="") as csv_file:
+        return [(int(row["id"]), int(row["stargazers_count"])) for row in csv.DictReader(csv_file)]
+
+
+def test_last_record_wins_and_csv_is_sorted_by_stars(tmp_path):
+    sink = RepositorySink(str(tmp_path / "rxjava.jsonl"), flush_every=2)
+    for repo_id, stars in [(1, 50), (2, 40), (3, 30)]:
+        sink.add(record(repo_id, stars))
+    sink.close()
+    # a search resumed from the same sink, where repo 3 gained stars and repo 4 is new
+    sink = RepositorySink(str(tmp_path / "rxjava.jsonl"))
+    sink.add(record(3, 60))
+    sink.add(record(4, 45))
+    sink.close()
+    sink.to_csv(str(tmp_path / "rxjava.csv"))
+    assert read_csv(tmp_path / "rxjava.csv") == [(3, 60), (1, 50), (4, 45), (2, 40)]
+
+
+def test_search_resumes_after_a_crash(tmp_path):
+    sink = RepositorySink(str(tmp_path / "rxjava.jsonl"))
+    sink.add(record(1, 50))
+    sink.close()
+    # the last line of a crashed run, written halfway
+    with open(tmp_path / "rxjava.jsonl", "a", encoding="utf-8") as sink_file:
+        sink_file.write('{"id": 2, "full_na')
+    sink = RepositorySink(str(tmp_path / "rxjava.jsonl"))
+    sink.add(record(3, 30))
+    sink.close()
+    sink.to_csv(str(tmp_path / "rxjava.csv"))
+    assert read_csv(tmp_path / "rxjava.csv") == [(1, 50), (3, 30)]
@@ -0,0 +1,39 @@
+import asyncio
+import csv
+import time
+
+import repositories_searching
+from fake_github import FakeSession, fake_repos
+from repositories_searching import AsyncSearchEngine, RepositorySink
+
+
+def test_throttled_search_does_not_hold_back_graphql():
+    async def acquire_both():
+        engine = AsyncSearchEngine(["token"], session=FakeSession())
+        engine.buckets[0]["search"].blocked_until = time.time() + 30
+        search = asyncio.create_task(engine.acquire("search"))
+        await asyncio.sleep(0)
+        start = time.monotonic()
+        await asyncio.wait_for(engine.acquire("graphql"), timeout=5)
+        seconds = time.monotonic() - start
+        search.cancel()
+        return seconds
+
+    assert asyncio.run(acquire_both()) < 1
+
+
+def test_search_all_finds_every_repo(tmp_path, monkeypatch):
+    # buckets that never throttle, the pacing is not what is tested here
+    monkeypatch.setattr(repositories_searching, "RATE_LIMITS",
+                        {resource: (100000, 1) for resource in repositories_searching.RATE_LIMITS})
+    repos = fake_repos(total=1500, zero_stars=600)
+    sinks = {technology: RepositorySink(str(tmp_path / f"{technology}.jsonl")) for technology in ["rxjava", "rxjs"]}
+    engine = AsyncSearchEngine(["token1", "token2"], session=FakeSession(repos))
+    asyncio.run(engine.search_all(sinks))
+    for technology, sink in sinks.items():
+        sink.close()
+        sink.to_csv(str(tmp_path / f"{technology}.csv"))
+        with open(tmp_path / f"{technology}.csv", "r", encoding="utf-8", newline="") as csv_file:
+            rows = list(csv.DictReader(csv_file))
+        assert sorted(int(row["id"]) for row in rows) == sorted(repo[2] for repo in repos)
+        assert [int(row["stargazers_count"]) for row in rows] == sorted((repo[0] for repo in repos), reverse=True)
@@ -0,0 +1,30 @@
+import datetime
+
+from fake_github import fake_repos, matching
+from search_planner import SEARCH_LIMIT, plan_queries
+
+
+def test_plan_covers_every_repo_once():
+    repos = fake_repos()
+    windows = plan_queries(lambda query: len(matching(repos, query)), "language:java")
+    assert all(total < SEARCH_LIMIT for _, total in windows)
+    found = [repo for window_query, _ in windows for repo in matching(repos, window_query)]
+    assert sorted(found) == sorted(repos)
+    assert any("created:<=" in window_query for window_query, _ in windows)
+    assert any("created:>=" in window_query for window_query, _ in windows)
+
+
+def test_plan_keeps_repos_created_after_today():
+    # created since the plan was made, or already tomorrow in UTC
+    tomorrow = datetime.date.today() + datetime.timedelta(days=1)
+    repos = fake_repos() + [(0, tomorrow, 10000 + index) for index in range(5)]
+    windows = plan_queries(lambda query: len(matching(repos, query)), "language:java")
+    found = [repo for window_query, _ in windows for repo in matching(repos, window_query)]
+    assert sorted(found) == sorted(repos)
+
+
+def test_window_over_the_limit_is_warned(capsys):
+    repos = fake_repos()
+    windows = plan_queries(lambda query: len(matching(repos, query)), split_dates=False)
+    assert max(total for _, total in windows) >= SEARCH_LIMIT
+    assert "Warning: stars:0..0 has 1275 results" in capsys.readouterr().out
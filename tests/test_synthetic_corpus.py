@@ -0,0 +1,34 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from repositories_processing import FILE_EXTENSIONS, REPO_LIST_PATH  # noqa: E402
+from synthetic_corpus import generate_corpus  # noqa: E402
+
+
+def corpus_files(root):
+    files = {}
+    for folder, _, names in os.walk(f"{root}/repos"):
+        for name in names:
+            with open(f"{folder}/{name}", "rb") as source:
+                files[os.path.relpath(f"{folder}/{name}", root)] = source.read()
+    return files
+
+
+def test_every_technology_and_extension(tmp_path):
+    root = generate_corpus(str(tmp_path / "corpus"), repos=3, files=30, file_size=256)
+    files = corpus_files(root)
+    for technology, extensions in FILE_EXTENSIONS.items():
+        for extension in extensions:
+            assert any(file.startswith(f"repos/{technology}/") and file.endswith(f".{extension}") for file in files)
+    assert any(file.startswith("repos/rxdart/") and "/lib/" in file and "/build/" not in file for file in files)
+    with open(f"{root}/{REPO_LIST_PATH}", "r") as repo_list_file:
+        assert sorted(json.load(repo_list_file)) == sorted(FILE_EXTENSIONS)
+
+
+def test_deterministic(tmp_path):
+    first = corpus_files(generate_corpus(str(tmp_path / "first"), seed=3, repos=2, files=5, file_size=256))
+    second = corpus_files(generate_corpus(str(tmp_path / "second"), seed=3, repos=2, files=5, file_size=256))
+    assert first == second
@@ -0,0 +1,31 @@
+import json
+import os
+
+import repositories_processing
+from repositories_processing import (STATS_CSV, STATS_PATH, TECHNOLOGIES, UNUSED_CSV, UNUSED_PATH, USAGE_CSV,
+                                     process_usage, save_usage)
+
+OPERANDS = {"rxjava": {"map": {"a_b": 3, "c_d": 0}, "filter": {"a_b": 1}},
+            "rxjs": {"pipe": {"e_f": 2}, "take": {}},
+            "rxswift": {"bind": {"g_h": 5}},
+            "rxkotlin": {"subscribeBy": {}}}
+
+
+def test_outputs_from_a_single_load(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("indexes")
+    loads = []
+    load_usage = repositories_processing.load_usage
+    monkeypatch.setattr(repositories_processing, "load_usage", lambda: loads.append(1) or load_usage())
+    save_usage(OPERANDS)
+    assert loads == []
+    with open(USAGE_CSV, "r") as csv_file:
+        assert csv_file.read().count("\n") == 5
+    process_usage()
+    assert loads == [1]
+    for path in [STATS_PATH, STATS_CSV, UNUSED_PATH, UNUSED_CSV]:
+        assert os.path.exists(path)
+    with open(STATS_PATH, "r") as stats_json:
+        stats = json.load(stats_json)
+    assert stats["RxJava"]["map"]["total_uses"] == 3
+    assert sorted(stats) == sorted(repositories_processing.DISTRIBUTIONS[technology] for technology in TECHNOLOGIES)
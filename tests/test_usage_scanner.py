@@ -0,0 +1,95 @@
+import random
+import re
+
+import pytest
+
+from file_ingest import FileReader
+from repositories_processing import count_word
+from usage_scanner import UNICODE_BLANK, OperandMatcher, PipeOperandMatcher
+
+OPERANDS = ["map", "flatMap", "filter", "a", "drop-while", "take", "subscribe"]
+# calls and near misses of count_word's "\.<operand>[^\w;\.]*\(" rule
+FRAGMENTS = [".map(", ".map (", ".flatMap\r\n(", ".a.map(", ".map\u00a0(", ".map\u00a0\u00a0(x)", ".drop-while(",
+             ".drop-while (", ".filter;(", ".filter.(", ".mapper(", "map(", ".take", ".subscribe(() => x)",
+             "x.flatMap<T>(", ".filter\t(", ".a(", ".a;(", ".subscribe\n\n(", "// .take(1)", "'.map('", "\n", " "]
+
+
+def corpus(seed, length=400):
+    rnd = random.Random(seed)
+    return "".join(rnd.choice(FRAGMENTS) + rnd.choice(["", "y", " ", "\n", "é"]) for _ in range(length))
+
+
+def expected_counts(operands, path_file):
+    return {operand: count_word(operand, str(path_file), None) for operand in operands}
+
+
+@pytest.mark.parametrize("text", FRAGMENTS + [corpus(seed) for seed in range(20)])
+def test_count_text_matches_count_word(tmp_path, text):
+    path_file = tmp_path / "Sample.java"
+    path_file.write_text(text, encoding="utf-8", newline="")
+    matcher = OperandMatcher(OPERANDS)
+    expected = expected_counts(OPERANDS, path_file)
+    assert {operand: matcher.count_text(text)[operand] for operand in OPERANDS} == expected
+    assert {operand: matcher.count_file(str(path_file))[operand] for operand in OPERANDS} == expected
+
+
+def test_edge_cases():
+    matcher = OperandMatcher(OPERANDS)
+    counts = matcher.count_text(".map (\n.flatMap\r\n(\n.a.map(\n.map\u00a0(\n.drop-while(\n.mapper(\n")
+    assert counts == {"map": 3, "flatMap": 1, "drop-while": 1}
+
+
+@pytest.mark.parametrize("tokenize", [False, True])
+@pytest.mark.parametrize("text", [".map (x);\n" * 1000 + ".filter(y);\n", ".map(x); // é\n.take (1)\n",
+                                  ".map(x);\n.drop-while (y)\n.flatMap\r\n(z)\n"])
+def test_memory_mapped_files_count_like_decoded_ones(tmp_path, text, tokenize):
+    path_file = tmp_path / "Sample.js"
+    path_file.write_text(text, encoding="utf-8", newline="")
+    matcher = OperandMatcher(OPERANDS, tokenize)
+    decoded = FileReader(mmap_threshold=len(text.encode()) + 1).count_file(matcher, str(path_file), "rxjs/a/Sample.js")
+    mapped = FileReader(mmap_threshold=1).count_file(matcher, str(path_file), "rxjs/a/Sample.js")
+    assert mapped == decoded == matcher.count_text(text, "js")
+
+
+# non ASCII characters where the bytes and str patterns differ: word characters, blanks, and a broken sequence
+NON_ASCII_FRAGMENTS = ["é", "\u00a0", "\u3000", "\u2028", "→", "\x1c", "\udcff"]
+PIPE_FRAGMENTS = ["pipe(", "pipe (", "map(", "filter\u00a0(", "take (1)", ")", ",", "(", "/* c */", "// c\n", "'s(' ",
+                  "x", "\n", " "]
+
+
+def mixed_corpus(seed, fragments, length=300):
+    rnd = random.Random(seed)
+    return "".join(rnd.choice(fragments + NON_ASCII_FRAGMENTS) for _ in range(length))
+
+
+@pytest.mark.parametrize("seed", range(30))
+@pytest.mark.parametrize("tokenize", [False, True])
+def test_count_buffer_matches_count_text_with_non_ascii_characters(seed, tokenize):
+    text = mixed_corpus(seed, FRAGMENTS + [".map", ".filter ", "(", "'", '"', "/", "`"])
+    data = text.encode("utf-8", errors="surrogateescape")
+    matcher = OperandMatcher(OPERANDS, tokenize)
+    assert matcher.count_buffer(data, "js") == matcher.count_bytes(data, "js")
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_pipe_count_buffer_matches_count_text(seed):
+    text = mixed_corpus(seed, PIPE_FRAGMENTS)
+    data = text.encode("utf-8", errors="surrogateescape")
+    matcher = PipeOperandMatcher(OPERANDS)
+    assert matcher.count_buffer(data, "js") == matcher.count_bytes(data, "js")
+
+
+def test_pipe_edge_cases():
+    matcher = PipeOperandMatcher(OPERANDS)
+    for text, expected in [("pipe(map(x), \u00a0filter\u00a0(y))", {"map": 1, "filter": 1}),
+                           ("pipe(émap(x), \u3000take(1))", {"take": 1}), ("épipe(map(x))", {})]:
+        assert matcher.count_text(text) == expected
+        assert matcher.count_buffer(text.encode()) == expected
+
+
+def test_unicode_blank_is_the_str_blank():
+    blanks = [chr(code) for code in range(0x110000) if re.fullmatch(r"\s", chr(code)) and not 0xd800 <= code < 0xe000]
+    others = [chr(code) for code in range(0x80, 0x3100) if chr(code) not in blanks and not 0xd800 <= code < 0xe000]
+    pattern = re.compile(UNICODE_BLANK + b"+")
+    assert all(pattern.fullmatch(blank.encode()) for blank in blanks)
+    assert not any(pattern.fullmatch(other.encode()) for other in others)
@@ -0,0 +1,21 @@
+from usage_store import load_usage_store, save_usage_store, store_is_current, usage_from_store
+from usage_table import UsageTable
+
+# a 0 count is kept apart from a repo missing for an operand
+OPERANDS = {"rxjava": {"map": {"a_b": 3, "c_d": 0}, "filter": {"a_b": 1}, "unused": {}},
+            "rxjs": {"pipe": {"e_f": 2}}}
+
+
+def test_store_round_trip(tmp_path):
+    save_usage_store(OPERANDS, str(tmp_path / "usage"))
+    store = load_usage_store(str(tmp_path / "usage"))
+    assert usage_from_store(store) == OPERANDS
+    assert store_is_current(str(tmp_path / "usage"), str(tmp_path / "missing.json"))
+
+
+def test_table_from_store_equals_table_from_usage(tmp_path):
+    save_usage_store(OPERANDS, str(tmp_path / "usage"))
+    from_store = UsageTable.from_store(load_usage_store(str(tmp_path / "usage")), list(OPERANDS))
+    from_usage = UsageTable.from_usage(OPERANDS, list(OPERANDS))
+    assert from_store.table.astype(str).values.tolist() == from_usage.table.astype(str).values.tolist()
+    assert from_store.stats() == from_usage.stats()
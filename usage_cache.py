@@ -0,0 +1,112 @@
+import hashlib
+import json
+import os
+import sqlite3
+from collections import Counter
+
+from file_ingest import FileReader, open_source
+from usage_scanner import OperandMatcher, project_of
+
+
+def hash_content(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class UsageCache:
+    '''Per file operand counts of previous runs, stored in SQLite. An entry is reused while the file keeps its size and
+    mtime, or failing that its content hash, and was counted with the same operand set. The kind FileReader flagged
+    a file with is kept too.'''
+
+    def __init__(self, path) -> None:
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS file_usage (technology TEXT, path TEXT, fingerprint TEXT, "
+                                "size INTEGER, mtime_ns INTEGER, content_hash TEXT, counts TEXT, kind TEXT, "
+                                "PRIMARY KEY (technology, path))")
+        # caches from before kinds were kept
+        if "kind" not in [column[1] for column in self.connection.execute("PRAGMA table_info(file_usage)")]:
+            self.connection.execute("ALTER TABLE file_usage ADD COLUMN kind TEXT")
+
+    def lookup(self, technology, fingerprint, files, repos_path="repos"):
+        '''Splits files into ({file: Counter} of the unchanged ones, [(file, stored content hash or None)] to scan).'''
+        entries = {path: entry for path, *entry in self.connection.execute(
+            "SELECT path, fingerprint, size, mtime_ns, content_hash, counts FROM file_usage WHERE technology = ?",
+            (technology,))}
+        hits = {}
+        misses = []
+        for file in files:
+            entry = entries.get(file)
+            if entry is None or entry[0] != fingerprint:
+                misses.append((file, None))
+                continue
+            try:
+                stat = os.stat(f"{repos_path}/{file}")
+            except FileNotFoundError:
+                misses.append((file, None))
+                continue
+            if entry[1] == stat.st_size and entry[2] == stat.st_mtime_ns:
+                hits[file] = Counter(json.loads(entry[4]))
+            else:
+                misses.append((file, entry[3] if entry[1] == stat.st_size else None))
+        return hits, misses
+
+    def update(self, technology, fingerprint, results):
+        '''Stores the results of scan_changed_files and returns their counts as {file: Counter}.'''
+        file_counts = {}
+        rows = []
+        for file, size, mtime_ns, content_hash, counts, kind in results:
+            if content_hash is None:
+                # missing file, nothing to remember
+                file_counts[file] = counts
+                continue
+            if counts is None:
+                stored = self.connection.execute("SELECT counts, kind FROM file_usage "
+                                                 "WHERE technology = ? AND path = ?", (technology, file)).fetchone()
+                counts, kind = Counter(json.loads(stored[0])), stored[1]
+            file_counts[file] = counts
+            rows.append((technology, file, fingerprint, size, mtime_ns, content_hash, json.dumps(counts), kind))
+        self.connection.executemany("INSERT OR REPLACE INTO file_usage "
+                                    "(technology, path, fingerprint, size, mtime_ns, content_hash, counts, kind) "
+                                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        self.connection.commit()
+        return file_counts
+
+    def prune(self, technology, files):
+        files = set(files)
+        stale = [(technology, path) for path, in self.connection.execute(
+            "SELECT path FROM file_usage WHERE technology = ?", (technology,)) if path not in files]
+        self.connection.executemany("DELETE FROM file_usage WHERE technology = ? AND path = ?", stale)
+        self.connection.commit()
+
+    def kinds(self, technology):
+        # {file: kind} of the flagged files
+        return dict(self.connection.execute(
+            "SELECT path, kind FROM file_usage WHERE technology = ? AND kind IS NOT NULL", (technology,)))
+
+    def close(self):
+        self.connection.close()
+
+
+def scan_changed_files(operands, misses, repos_path="repos", reader=None):
+    '''Counts the files the cache could not answer, as (file, size, mtime_ns, content_hash, counts, kind) tuples, with
+    the reader that counted them. counts is None when the content hash still matches the stored one, content_hash is
+    None when the file does not exist.'''
+    matcher = operands if isinstance(operands, OperandMatcher) else OperandMatcher(operands)
+    reader = FileReader() if reader is None else reader
+    results = []
+    for file, stored_hash in misses:
+        try:
+            with open_source(f"{repos_path}/{file}", reader.mmap_threshold) as (data, stat):
+                content_hash = hash_content(data)
+                counts = None if content_hash == stored_hash else reader.count_data(matcher, file, data)
+        except FileNotFoundError:
+            results.append((file, 0, 0, None, Counter(), None))
+            continue
+        results.append((file, stat.st_size, stat.st_mtime_ns, content_hash, counts, reader.flagged.get(file)))
+    return results, reader
+
+
+def partial_usage_of(technology, file_counts):
+    partial_usage = {}
+    for file, counts in file_counts.items():
+        partial_usage.setdefault(project_of(file, technology), Counter()).update(counts)
+    return partial_usage
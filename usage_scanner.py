@@ -0,0 +1,292 @@
+import hashlib
+import os
+import re
+from collections import Counter
+
+from file_ingest import FileReader, extension_of
+
+# Any ".identifier ... (" call; the identifier is then looked up in the operand set. Since the gap before "(" can
+# not contain "." or word characters, this finds exactly the same calls as count_word's per operand regex.
+CALL_PATTERN = re.compile(r"\.(\w+)[^\w;\.]*\(")
+WORD_PATTERN = re.compile(r"\w+")
+
+# comments and string literals, matched as a whole so that calls inside them are skipped. Interpolated code, like
+# ${...} in templates, is skipped with its string.
+COMMENT = r"/(?:/[^\n]*|\*[\s\S]*?\*/)"
+DOUBLE_QUOTED = r'"[^"\\\n]*(?:\\.[^"\\\n]*)*"'
+SINGLE_QUOTED = r"'[^'\\\n]*(?:\\.[^'\\\n]*)*'"
+TRIPLE_DOUBLE_QUOTED = r'"""[\s\S]*?"""'
+TRIPLE_SINGLE_QUOTED = r"'''[\s\S]*?'''"
+BACKTICK_QUOTED = r"`[^`\\]*(?:\\.[^`\\]*)*`"
+VERBATIM_QUOTED = r'@"[^"]*(?:""[^"]*)*"'
+LANGUAGE_LITERALS = {"java": [COMMENT, TRIPLE_DOUBLE_QUOTED, DOUBLE_QUOTED, SINGLE_QUOTED],
+                     "kt": [COMMENT, TRIPLE_DOUBLE_QUOTED, DOUBLE_QUOTED, SINGLE_QUOTED],
+                     "js": [COMMENT, DOUBLE_QUOTED, SINGLE_QUOTED, BACKTICK_QUOTED],
+                     "ts": [COMMENT, DOUBLE_QUOTED, SINGLE_QUOTED, BACKTICK_QUOTED],
+                     "cs": [COMMENT, VERBATIM_QUOTED, DOUBLE_QUOTED, SINGLE_QUOTED],
+                     "swift": [COMMENT, TRIPLE_DOUBLE_QUOTED, DOUBLE_QUOTED],
+                     "dart": [COMMENT, TRIPLE_DOUBLE_QUOTED, TRIPLE_SINGLE_QUOTED, DOUBLE_QUOTED, SINGLE_QUOTED]}
+# one pass per file: literals match with an empty group, calls with their name
+TOKEN_PATTERNS = {extension: re.compile("|".join([CALL_PATTERN.pattern] + literals))
+                  for extension, literals in LANGUAGE_LITERALS.items()}
+# the same for memory mapped files, scanned as bytes. Bytes patterns take every non ASCII byte for a blank before a
+# "(", so they find all the calls of the str patterns and a few more (like ".mapé(" or ".map é("): only the calls
+# with non ASCII bytes in them are decoded, and kept if the str pattern matches the start of them as well. Bytes that
+# are not UTF-8, which the decoded scan drops, still split the names around them
+NON_ASCII_BYTE = re.compile(rb"[\x80-\xff]")
+BYTE_CALL_PATTERN = re.compile(CALL_PATTERN.pattern.encode())
+BYTE_TOKEN_PATTERNS = {extension: re.compile(BYTE_CALL_PATTERN.pattern + b"|" + "|".join(literals).encode())
+                       for extension, literals in LANGUAGE_LITERALS.items()}
+# what starts a literal, in the blanks of a call that the bytes patterns took and the str ones did not
+LITERAL_START = re.compile(r"[/\"'`@]")
+# what the pipe scoped rxjs count looks at: literals (skipped whole, so their parentheses do not count), calls with
+# their name, and the parentheses and commas that delimit the arguments of a call
+PIPE_TOKEN_PATTERN = re.compile("|".join(LANGUAGE_LITERALS["js"] + [r"(\w+)\s*\(", r"[(),]"]))
+# the same as bytes, with the UTF-8 of the non ASCII characters that the str \s matches
+UNICODE_BLANK = (rb"(?:[\s\x1c-\x1f]|\xc2[\x85\xa0]|\xe1\x9a\x80|\xe2\x80[\x80-\x8a\xa8\xa9\xaf]|\xe2\x81\x9f"
+                 rb"|\xe3\x80\x80)")
+PIPE_BYTE_TOKEN_PATTERN = re.compile("|".join(LANGUAGE_LITERALS["js"]).encode() + rb"|(\w+)" + UNICODE_BLANK +
+                                     rb"*\(|[(),]")
+# a shard of schedule_shards closes at this many bytes, so that large files get a worker each
+SHARD_BYTES = 8 * 1024 * 1024
+
+
+class OperandMatcher:
+    '''Counts every operand of a technology in a single pass over the text, with the same results as calling
+    count_word once per operand.'''
+
+    def __init__(self, operands, tokenize=False) -> None:
+        self.operands = sorted(operands)
+        # skip comments and string literals of the languages in LANGUAGE_LITERALS
+        self.tokenize = tokenize
+        self.word_operands = frozenset(operand for operand in self.operands if WORD_PATTERN.fullmatch(operand))
+        # operands that are not plain identifiers (e.g. "drop-while") keep the original per operand regex
+        self.other_patterns = [(operand, re.compile(r"\." + operand + r"[^\w;\.]*\("))
+                               for operand in self.operands if operand not in self.word_operands]
+        self.byte_operands = {operand.encode(): operand for operand in self.word_operands}
+        self.other_byte_patterns = [(operand, re.compile(pattern.pattern.encode()))
+                                    for operand, pattern in self.other_patterns]
+        # identifies the operand set (and matching rules) that produced a count, for cached results
+        patterns = [CALL_PATTERN.pattern] + [pattern.pattern for pattern in TOKEN_PATTERNS.values() if tokenize]
+        self.fingerprint = hashlib.sha1("\n".join(patterns + self.operands).encode()).hexdigest()
+
+    def count_text(self, text, extension=None):
+        word_operands = self.word_operands
+        pattern = TOKEN_PATTERNS.get(extension, CALL_PATTERN) if self.tokenize else CALL_PATTERN
+        counts = Counter(name for name in pattern.findall(text) if name in word_operands)
+        for operand, pattern in self.other_patterns:
+            word_count = len(pattern.findall(text))
+            if word_count:
+                counts[operand] += word_count
+        return counts
+
+    def count_bytes(self, data, extension=None):
+        return self.count_text(data.decode("utf-8", errors="ignore"), extension)
+
+    def count_buffer(self, buffer, extension=None):
+        # bytes or mmap, without decoding more of it than the calls with non ASCII characters
+        byte_operands = self.byte_operands
+        pattern = BYTE_TOKEN_PATTERNS.get(extension, BYTE_CALL_PATTERN) if self.tokenize else BYTE_CALL_PATTERN
+        if NON_ASCII_BYTE.search(buffer) is None:
+            name_counts = Counter(name for name in pattern.findall(buffer) if name in byte_operands)
+            counts = Counter({byte_operands[name]: word_count for name, word_count in name_counts.items()})
+            for operand, byte_pattern in self.other_byte_patterns:
+                word_count = len(byte_pattern.findall(buffer))
+                if word_count:
+                    counts[operand] += word_count
+            return counts
+        counts = Counter()
+        for call in pattern.finditer(buffer):
+            name = call.group(1)
+            if name is None:
+                continue
+            if NON_ASCII_BYTE.search(buffer, call.start(), call.end()):
+                text = match_text(buffer, call)
+                text_call = CALL_PATTERN.match(text)
+                if text_call is not None and text_call.group(1) != name.decode():
+                    text_call = None
+                if pattern is not BYTE_CALL_PATTERN and \
+                        LITERAL_START.search(text, text_call.end() if text_call else 1) is not None:
+                    # the str tokens start a literal in what the bytes took for the blanks of this call, and may
+                    # skip past it: the rest is counted as text
+                    rest = buffer[call.start():].decode("utf-8", errors="ignore")
+                    counts.update(name for name in TOKEN_PATTERNS[extension].findall(rest)
+                                  if name in self.word_operands)
+                    break
+                if text_call is None:
+                    continue
+            if name in byte_operands:
+                counts[byte_operands[name]] += 1
+        for (operand, text_pattern), (_, byte_pattern) in zip(self.other_patterns, self.other_byte_patterns):
+            word_count = sum(1 for match in byte_pattern.finditer(buffer)
+                             if not NON_ASCII_BYTE.search(buffer, match.start(), match.end())
+                             or text_pattern.match(match_text(buffer, match)))
+            if word_count:
+                counts[operand] += word_count
+        return counts
+
+    def count_file(self, path_file):
+        try:
+            with open(path_file, encoding="utf-8", errors="ignore") as f:
+                return self.count_text(f.read(), extension_of(path_file))
+        except FileNotFoundError:
+            return Counter()
+
+
+class PipeOperandMatcher(OperandMatcher):
+    '''Counts only the operators passed straight to a pipe(...) call, like count_usage_rxjs meant to, in one pass
+    over the text: every argument of a pipe that starts with a call to an operand counts once.'''
+
+    def __init__(self, operands, tokenize=False) -> None:
+        super().__init__(operands, tokenize)
+        self.fingerprint = hashlib.sha1("\n".join([PIPE_TOKEN_PATTERN.pattern] + self.operands).encode()).hexdigest()
+
+    def count_text(self, text, extension=None):
+        if "pipe" not in text:
+            return Counter()
+        return self.count_tokens(text, PIPE_TOKEN_PATTERN)
+
+    def count_buffer(self, buffer, extension=None):
+        # bytes or mmap, tokenized as bytes and decoded only where a name or the blanks before it are not ASCII
+        if buffer.find(b"pipe") < 0:
+            return Counter()
+        return self.count_tokens(buffer, PIPE_BYTE_TOKEN_PATTERN)
+
+    def count_tokens(self, data, pattern):
+        word_operands = self.word_operands
+        as_bytes = not isinstance(data, str)
+        counts = Counter()
+        # one entry per open parenthesis, True for the ones of a pipe call
+        pipes = []
+        # where the current argument starts, None once something other than blanks came before the next call
+        argument_start = None
+        for token in pattern.finditer(data):
+            name = token.group(1)
+            if name is not None:
+                if as_bytes:
+                    # a name after a non ASCII word character is longer in the text, and no operand
+                    name = "" if follows_word_character(data, token.start()) else name.decode()
+                if name in word_operands and pipes and pipes[-1] and argument_start is not None \
+                        and is_blank(data[argument_start:token.start()]):
+                    counts[name] += 1
+                pipes.append(name == "pipe")
+                argument_start = token.end()
+                continue
+            # the first character tells the delimiters and literals apart
+            delimiter = token.group()[:1]
+            if as_bytes:
+                delimiter = delimiter.decode("ascii")
+            if delimiter == "(":
+                pipes.append(False)
+                argument_start = token.end()
+            elif delimiter == ",":
+                argument_start = token.end()
+            elif delimiter == "/":
+                # comments count as blanks
+                if argument_start is not None:
+                    argument_start = token.end()
+            else:
+                # ")" or a string
+                if delimiter == ")" and pipes:
+                    pipes.pop()
+                argument_start = None
+        return counts
+
+
+def match_text(buffer, match):
+    return buffer[match.start():match.end()].decode("utf-8", errors="ignore")
+
+
+def is_blank(text):
+    # str, or bytes decoded for the non ASCII blanks of str.strip
+    if isinstance(text, bytes):
+        text = text.decode("utf-8", errors="ignore")
+    return not text.strip()
+
+
+def follows_word_character(buffer, position):
+    # whether the bytes before position end with a non ASCII word character
+    if position == 0 or buffer[position - 1] < 0x80:
+        return False
+    before = buffer[max(0, position - 4):position].decode("utf-8", errors="ignore")
+    return bool(before) and WORD_PATTERN.fullmatch(before[-1]) is not None
+
+
+def matcher_of(technology, operands, tokenize=False, pipe_scoped=False):
+    # pipe_scoped only changes how rxjs is counted, the other technologies have no pipe operators
+    if pipe_scoped and technology == "rxjs":
+        return PipeOperandMatcher(operands, tokenize)
+    return OperandMatcher(operands, tokenize)
+
+
+def build_matchers(operands, technologies, tokenize=False, pipe_scoped=False):
+    return {technology: matcher_of(technology, operands[technology].keys(), tokenize, pipe_scoped)
+            for technology in technologies}
+
+
+def project_of(file, technology):
+    technology_length = len(technology)
+    return file[technology_length+1: file[technology_length+1:].find("/") + technology_length+1]
+
+
+def scan_files(technology, operands, files, repos_path="repos", reader=None):
+    '''Partial usage of a shard of an index file: {project: Counter(operand: uses)}, with only non zero counts.
+    Every project that had at least one file scanned is present, even if nothing was found in it. Returned with the
+    reader, that holds the stats of the shard.'''
+    matcher = operands if isinstance(operands, OperandMatcher) else OperandMatcher(operands)
+    reader = FileReader() if reader is None else reader
+    partial_usage = {}
+    for file in files:
+        project_usage = partial_usage.setdefault(project_of(file, technology), Counter())
+        project_usage.update(reader.count_file(matcher, f"{repos_path}/{file}", file))
+    return partial_usage, reader
+
+
+def scan_file_counts(operands, files, repos_path="repos", reader=None):
+    '''Per file counts of a shard of files, as [(file, Counter)], with the reader that counted them.'''
+    matcher = operands if isinstance(operands, OperandMatcher) else OperandMatcher(operands)
+    reader = FileReader() if reader is None else reader
+    return [(file, reader.count_file(matcher, f"{repos_path}/{file}", file)) for file in files], reader
+
+
+def merge_usage(operands, technology, partial_usage):
+    technology_operands = operands[technology]
+    for project, project_usage in partial_usage.items():
+        for operand, operand_usage in technology_operands.items():
+            operand_usage[project] = operand_usage.get(project, 0) + project_usage[operand]
+    return operands
+
+
+def shard(files, shard_size):
+    return [files[i:i + shard_size] for i in range(0, len(files), shard_size)]
+
+
+def file_size(path_file):
+    try:
+        return os.stat(path_file).st_size
+    except OSError:
+        return 0
+
+
+def schedule_shards(technology_files, shard_size, shard_bytes=SHARD_BYTES, repos_path="repos", path_of=None):
+    '''The files of every technology as one queue of [(technology, files)] shards, largest first so that no big file
+    is left for last on a single worker. A shard holds files of one technology, up to shard_size files or shard_bytes
+    bytes. path_of gives the index path of an item of the file lists, that are index paths by default.'''
+    shards = []
+    for technology, files in technology_files.items():
+        sized = sorted(((file_size(f"{repos_path}/{path_of(file) if path_of else file}"), index, file)
+                        for index, file in enumerate(files)), key=lambda item: (-item[0], item[1]))
+        file_shard = []
+        shard_total = 0
+        for size, _, file in sized:
+            file_shard.append(file)
+            shard_total += size
+            if len(file_shard) >= shard_size or shard_total >= shard_bytes:
+                shards.append((shard_total, technology, file_shard))
+                file_shard = []
+                shard_total = 0
+        if file_shard:
+            shards.append((shard_total, technology, file_shard))
+    # stable, so shards of the same size keep the order of TECHNOLOGIES
+    shards.sort(key=lambda item: -item[0])
+    return [(technology, file_shard) for _, technology, file_shard in shards]
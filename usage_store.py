@@ -0,0 +1,52 @@
+import json
+import os
+
+import numpy
+
+# operand without an entry for the repo in operands_usage.json, as opposed to one used 0 times
+MISSING = -1
+INDEX_FILE = "index.json"
+
+
+def save_usage_store(operands, path):
+    '''Writes operands_usage as one operands x repos int32 matrix per technology (<technology>.npy), with the names of
+    its rows and columns in index.json.'''
+    os.makedirs(path, exist_ok=True)
+    index = {}
+    for technology, technology_usage in operands.items():
+        technology_operands = sorted(technology_usage)
+        repos = sorted({repo for operand_usage in technology_usage.values() for repo in operand_usage})
+        repo_positions = {repo: position for position, repo in enumerate(repos)}
+        matrix = numpy.full((len(technology_operands), len(repos)), MISSING, dtype=numpy.int32)
+        for row, operand in enumerate(technology_operands):
+            for repo, count in technology_usage[operand].items():
+                matrix[row, repo_positions[repo]] = count
+        numpy.save(f"{path}/{technology}.npy", matrix)
+        index[technology] = {"operands": technology_operands, "repos": repos}
+    with open(f"{path}/{INDEX_FILE}", "w") as index_file:
+        json.dump(index, index_file)
+
+
+def load_usage_store(path):
+    # {technology: (matrix, operands, repos)}, the matrices memory mapped rather than read
+    with open(f"{path}/{INDEX_FILE}", "r") as index_file:
+        index = json.load(index_file)
+    return {technology: (numpy.load(f"{path}/{technology}.npy", mmap_mode="r"), names["operands"], names["repos"])
+            for technology, names in index.items()}
+
+
+def usage_from_store(store):
+    # back to the nested operands_usage.json layout
+    operands = {}
+    for technology, (matrix, technology_operands, repos) in store.items():
+        operands[technology] = {}
+        for row, operand in enumerate(technology_operands):
+            operands[technology][operand] = {repos[column]: int(matrix[row, column])
+                                             for column in numpy.flatnonzero(matrix[row] != MISSING)}
+    return operands
+
+
+def store_is_current(path, json_path):
+    index_path = f"{path}/{INDEX_FILE}"
+    return os.path.exists(index_path) and (not os.path.exists(json_path)
+                                           or os.path.getmtime(index_path) >= os.path.getmtime(json_path))
@@ -0,0 +1,123 @@
+import sys
+
+import numpy
+import pandas
+
+from usage_store import MISSING
+
+# before Python 3.8 statistics.mode raised on ties, and calculate_stats reported them all as "a|b"
+MULTIMODE_TIES = sys.version_info < (3, 8)
+STATS_COLUMNS = ["total_uses", "repos_present", "median", "average_all", "average_present", "coverage", "mode"]
+
+
+class UsageTable:
+    '''operands_usage in long format, one (technology, operand, repo, count) row per usage, sorted like the keys of
+    operands_usage.json, with the operands of every technology (some have no usage at all).'''
+
+    def __init__(self, table, operands) -> None:
+        self.table = table
+        self.operands = operands
+
+    @classmethod
+    def from_usage(cls, operands_usage, technologies):
+        technology_column, operand_column, repo_column, counts = [], [], [], []
+        operands = {}
+        for technology in technologies:
+            operands[technology] = sorted(operands_usage[technology])
+            for operand in operands[technology]:
+                repos = sorted(operands_usage[technology][operand].items())
+                technology_column += [technology] * len(repos)
+                operand_column += [operand] * len(repos)
+                repo_column += [repo for repo, _ in repos]
+                counts += [count for _, count in repos]
+        return cls.from_columns(technology_column, operand_column, repo_column, counts, operands, technologies)
+
+    @classmethod
+    def from_columns(cls, technology_column, operand_column, repo_column, counts, operands, technologies):
+        all_operands = sorted({operand for technology in technologies for operand in operands[technology]})
+        table = pandas.DataFrame({
+            "technology": pandas.Categorical(technology_column, categories=technologies),
+            "operand": pandas.Categorical(operand_column, categories=all_operands),
+            "repo": pandas.Categorical(repo_column, categories=sorted(set(repo_column))),
+            "count": numpy.asarray(counts, dtype=numpy.int64)})
+        return cls(table, operands)
+
+    @classmethod
+    def from_store(cls, store, technologies):
+        # straight from the usage_store matrices, without building Python objects per usage
+        all_operands = numpy.array(sorted({operand for technology in technologies for operand in store[technology][1]}))
+        all_repos = numpy.array(sorted({repo for technology in technologies for repo in store[technology][2]}))
+        technology_codes, operand_codes, repo_codes, counts = [], [], [], []
+        for position, technology in enumerate(technologies):
+            matrix, operands, repos = store[technology]
+            rows, columns = numpy.nonzero(numpy.asarray(matrix) != MISSING)
+            technology_codes.append(numpy.full(len(rows), position, dtype=numpy.int8))
+            operand_codes.append(numpy.searchsorted(all_operands, operands).astype(numpy.int32)[rows])
+            repo_codes.append(numpy.searchsorted(all_repos, repos).astype(numpy.int32)[columns])
+            counts.append(numpy.asarray(matrix[rows, columns], dtype=numpy.int64))
+        table = pandas.DataFrame({
+            "technology": pandas.Categorical.from_codes(numpy.concatenate(technology_codes), categories=technologies),
+            "operand": pandas.Categorical.from_codes(numpy.concatenate(operand_codes), categories=all_operands),
+            "repo": pandas.Categorical.from_codes(numpy.concatenate(repo_codes), categories=all_repos),
+            "count": numpy.concatenate(counts)})
+        return cls(table, {technology: list(store[technology][1]) for technology in technologies})
+
+    def stats(self):
+        '''Per (technology, operand) statistics, the same values calculate_stats computed with the statistics
+        module, as Python numbers.'''
+        table = self.table
+        keys = ["technology", "operand"]
+        grouped = table.groupby(keys, observed=True, sort=False)["count"]
+        stats = pandas.DataFrame({"size": grouped.size(),
+                                  "total_uses": grouped.sum(),
+                                  "repos_present": (table["count"] > 0).groupby(
+                                      [table["technology"], table["operand"]], observed=True, sort=False).sum(),
+                                  "median": grouped.median()})
+        modes = self.modes()
+        records = {}
+        for (technology, operand), row in zip(stats.index, stats.itertuples(index=False)):
+            size, total, presence = int(row.size), int(row.total_uses), int(row.repos_present)
+            # like statistics.median, the middle value itself for an odd number of values
+            median = int(row.median) if size % 2 else float(row.median)
+            records[(technology, operand)] = {"total_uses": total,
+                                              "repos_present": presence,
+                                              "median": median,
+                                              "average_all": total / size,
+                                              "average_present": total / presence if presence > 0 else 0,
+                                              "coverage": presence / size,
+                                              "mode": modes[(technology, operand)]}
+        empty = dict.fromkeys(STATS_COLUMNS, 0)
+        return {technology: {operand: records.get((technology, operand), empty) for operand in operands}
+                for technology, operands in self.operands.items()}
+
+    def modes(self):
+        table = self.table.assign(position=self.table.groupby(["technology", "operand"], observed=True).cumcount())
+        values = table.groupby(["technology", "operand", "count"], observed=True).agg(
+            size=("position", "size"), first=("position", "min")).reset_index()
+        values = values[values["size"] == values.groupby(["technology", "operand"], observed=True)["size"]
+                        .transform("max")]
+        if not MULTIMODE_TIES:
+            # the most common value seen first
+            first = values.sort_values("first").groupby(["technology", "operand"], observed=True).head(1)
+            return {(technology, operand): int(count)
+                    for technology, operand, count in zip(first["technology"], first["operand"], first["count"])}
+        modes = {}
+        for (technology, operand), counts in values.groupby(["technology", "operand"], observed=True)["count"]:
+            counts = sorted(int(count) for count in counts)
+            modes[(technology, operand)] = counts[0] if len(counts) == 1 else f'"{"|".join(map(str, counts))}"'
+        return modes
+
+    def used_operands(self):
+        '''{technology: {repo: operands used - 1}} for the repos using any operand, in the order find_unused met
+        them (the first operand they use, then repo name).'''
+        table = self.table[self.table["count"] > 0]
+        operand_positions = table["operand"].cat.codes
+        used = (table.assign(operand_position=operand_positions)
+                .groupby(["technology", "repo"], observed=True)
+                .agg(used=("count", "size"), first=("operand_position", "min"))
+                .reset_index()
+                .sort_values(["first", "repo"]))
+        result = {technology: {} for technology in self.operands}
+        for technology, repo, total_used in zip(used["technology"], used["repo"], used["used"]):
+            result[technology][repo] = int(total_used) - 1
+        return result